@@ -1,85 +1,281 @@
-from flask import Flask, render_template, request
-from sqlalchemy import create_engine
+from flask import Flask, abort, jsonify, render_template, request, url_for
+from sqlalchemy import create_engine, select, func
 from sqlalchemy.orm import sessionmaker
-from xml_parser import EducationalOrganization, EducationalProgram, OrganizationProgramAssociation
+from models import (EducationalOrganization, EducationalProgram, OrganizationProgramAssociation,
+                    ProgramCatalogEntry, OrganizationHierarchy, OrganizationStats, RegionStats, FederalDistrictStats,
+                    Region, OrganizationForm, OrganizationType, UGS, EduLevel, Qualification,
+                    DataLoad, ChangeLogEntry, STATUS_ACCREDITED, STATUS_CANCELED, STATUS_SUSPENDED)
+from metrics import init_app as init_metrics, phase
+from query_log import install_slow_query_log
+from static_assets import init_app as init_assets
+from warmup import init_app as init_warmup
+from read_model import READ_MODEL_MODE, current_model, preload_model
+from single_flight import SingleFlight, normalize_key
+from query_budget import BudgetExceeded, install_query_budget, query_budget
+from search import install_unicode_lower, search_scores
+from history import ENTITY_TYPES, entity_at, entity_versions, load_at
 import os
+import json
 import math
+from collections import namedtuple
+from datetime import datetime
 
 app = Flask(__name__)
-app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
+# Файлы /static без отпечатка проверяются браузером по ETag/Last-Modified,
+# долгое кеширование - только у /assets с хешем содержимого в имени
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = None
 
 # Настройка подключения к БД
 DB_PATH = 'education.db'
 engine = create_engine(f'sqlite:///{DB_PATH}')
 Session = sessionmaker(bind=engine)
 
+# Метрики запросов: время по фазам, число SQL-запросов и /metrics
+init_metrics(app, engine)
+# Журнал медленных запросов с планом выполнения (порог в SLOW_QUERY_MS)
+install_slow_query_log(engine)
+# Прерывание запросов, не уложившихся в бюджет времени (QUERY_BUDGET_MS)
+install_query_budget(engine)
+# lower() с учетом кириллицы для ilike-фильтров, как в колоночной модели
+install_unicode_lower(engine)
+# CSS с отпечатком содержимого, заранее сжатые варианты и сжатие HTML/JSON ответов
+init_assets(app)
+# Общий для воркеров снимок данных, собранный до fork (READ_MODEL=preload);
+# соединения пула закрываются, чтобы воркеры не унаследовали дескрипторы SQLite
+if READ_MODEL_MODE == 'preload' and os.path.exists(DB_PATH):
+    preload_model(Session, DB_PATH)
+    engine.dispose()
+# Прогрев частых страниц после каждой новой загрузки данных (WARMUP_*)
+init_warmup(app, Session)
+
+# Поля сортировки списка: текстовые значения справочников сортируются
+# по присоединенной таблице-справочнику
+SORT_FIELDS = {
+    'Id': (EducationalOrganization.Id, None),
+    'FullName': (EducationalOrganization.FullName, None),
+    'RegionName': (Region.Name, EducationalOrganization.region),
+    'FormName': (OrganizationForm.Name, EducationalOrganization.form),
+    'TypeName': (OrganizationType.Name, EducationalOrganization.org_type),
+    'ProgramCount': (OrganizationStats.ProgramCount, EducationalOrganization.stats),
+    'AccreditedCount': (OrganizationStats.AccreditedCount, EducationalOrganization.stats),
+    'UGSCount': (OrganizationStats.UGSCount, EducationalOrganization.stats),
+}
+
+
+# Длина текстовых фильтров ограничена: шаблон LIKE по длинной строке
+# проверяется на каждой записи каталога
+MAX_FILTER_TEXT = 100
+# Целые параметры приводятся к диапазону INTEGER SQLite: большее число
+# в условии или OFFSET драйвер не передает и запрос падает с OverflowError
+SQLITE_MAX_INT = 2 ** 63 - 1
+# Номер страницы ограничен, чтобы OFFSET не перебирал весь реестр
+MAX_PAGE = 10000
+
+
+def bounded_int(value):
+    return min(max(int(value), -SQLITE_MAX_INT - 1), SQLITE_MAX_INT)
+
+
+def page_arg(args, name):
+    return min(max(args.get(name, 1, type=int), 1), MAX_PAGE)
+
+
+def parse_filters(args):
+    # Параметры фильтрации: справочные значения передаются целочисленными ключами,
+    # program_code - точный код программы из каталога,
+    # accredited=1 - только с аккредитованными программами,
+    # active=1 - без приостановленных и отмененных программ,
+    # min_programs - не меньше указанного числа программ (по готовым агрегатам),
+    # q - нечеткий поиск по названиям организаций и программ
+    return {
+        'q': args.get('q', '')[:MAX_FILTER_TEXT],
+        'region_id': args.get('region_id', type=bounded_int),
+        'form_id': args.get('form_id', type=bounded_int),
+        'ugs_id': args.get('ugs_id', type=bounded_int),
+        'program_name': args.get('program_name', '')[:MAX_FILTER_TEXT],
+        'program_code': args.get('program_code', '')[:MAX_FILTER_TEXT],
+        'accredited': args.get('accredited', type=bounded_int),
+        'active': args.get('active', type=bounded_int),
+        'min_programs': args.get('min_programs', type=bounded_int),
+    }
+
+
+def parse_sort(args):
+    # Сортировка только по полям из SORT_FIELDS; остальное - по Id.
+    # При поиске по умолчанию и по sort=relevance - по релевантности
+    searching = search_scores(args.get('q', '')[:MAX_FILTER_TEXT]) is not None
+    sort_field = args.get('sort', 'relevance' if searching else 'Id')
+    if sort_field not in SORT_FIELDS and not (sort_field == 'relevance' and searching):
+        sort_field = 'Id'
+    sort_order = 'asc' if args.get('order', 'asc') == 'asc' else 'desc'
+    return sort_field, sort_order
+
+
+def like_pattern(text):
+    # Подстрока для LIKE: % и _ из пользовательского ввода ищутся буквально
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def filter_organizations(query, filters):
+    scores = search_scores(filters['q'])
+    if scores is not None:
+        # Соединение с оценками поиска: по одной строке на найденную организацию
+        query = query.join(scores, scores.c.org_id == EducationalOrganization.Id)
+    if filters['region_id']:
+        query = query.filter(EducationalOrganization.RegionId == filters['region_id'])
+    if filters['form_id']:
+        query = query.filter(EducationalOrganization.FormId == filters['form_id'])
+    if filters['min_programs']:
+        query = query.filter(EducationalOrganization.Id.in_(
+            select(OrganizationStats.OrganizationId).where(OrganizationStats.ProgramCount >= filters['min_programs'])
+        ))
+
+    # Условия по программам проверяются на одной программе организации;
+    # полусоединение через IN не размножает строки организаций
+    catalog_conditions = []
+    if filters['program_name']:
+        catalog_conditions.append(ProgramCatalogEntry.ProgrammName.ilike(like_pattern(filters['program_name']), escape='\\'))
+    if filters['program_code']:
+        catalog_conditions.append(ProgramCatalogEntry.ProgrammCode == filters['program_code'])
+    if filters['ugs_id']:
+        catalog_conditions.append(ProgramCatalogEntry.UGSId == filters['ugs_id'])
+    status_conditions = []
+    if filters['accredited']:
+        status_conditions.append(EducationalProgram.IsAccredited)
+    if filters['active']:
+        status_conditions.append(EducationalProgram.IsActive)
+    if catalog_conditions or status_conditions:
+        matching = select(OrganizationProgramAssociation.organization_external_id)
+        if catalog_conditions:
+            matching = matching.join(
+                ProgramCatalogEntry,
+                OrganizationProgramAssociation.CatalogId == ProgramCatalogEntry.Id
+            ).where(*catalog_conditions)
+        if status_conditions:
+            matching = matching.join(
+                EducationalProgram,
+                OrganizationProgramAssociation.program_external_id == EducationalProgram.Id
+            ).where(*status_conditions)
+        query = query.filter(EducationalOrganization.Id.in_(matching))
+    return query
+
+
+def sort_organizations(query, sort_field, sort_order, join=True, q=''):
+    # join=False - справочники и агрегаты уже присоединены к запросу (проекция списка);
+    # relevance - по оценке поиска q, подзапрос уже присоединен filter_organizations
+    if sort_field == 'relevance' and search_scores(q) is not None:
+        return query.order_by(search_scores(q).c.score.desc(), EducationalOrganization.Id)
+    sort_column, sort_join = SORT_FIELDS.get(sort_field, SORT_FIELDS['Id'])
+    if join and sort_join is not None:
+        query = query.outerjoin(sort_join)
+    # Равные значения всегда по возрастанию Id, чтобы страницы не зависели
+    # от плана запроса и совпадали с колоночной моделью (READ_MODEL=1)
+    tie_breaker = () if sort_column is EducationalOrganization.Id else (EducationalOrganization.Id,)
+    if sort_order == 'asc':
+        return query.order_by(sort_column.asc(), *tie_breaker)
+    return query.order_by(sort_column.desc(), *tie_breaker)
+
+
+# Строка списка организаций: только отображаемые колонки без ORM-сущностей,
+# identity map и инструментирования атрибутов
+OrganizationRow = namedtuple('OrganizationRow', [
+    'Id', 'DisplayName', 'RegionName', 'FormName', 'TypeName', 'Phone', 'Email',
+    'ProgramCount', 'AccreditedCount', 'UGSCount'
+])
+
+LISTING_COLUMNS = (
+    EducationalOrganization.Id,
+    # Полное название выбирается, только если нет краткого
+    func.coalesce(func.nullif(EducationalOrganization.ShortName, ''), EducationalOrganization.FullName),
+    Region.Name,
+    OrganizationForm.Name,
+    OrganizationType.Name,
+    EducationalOrganization.Phone,
+    EducationalOrganization.Email,
+    func.coalesce(OrganizationStats.ProgramCount, 0),
+    func.coalesce(OrganizationStats.AccreditedCount, 0),
+    func.coalesce(OrganizationStats.UGSCount, 0),
+)
+
+
+def listing_query(session):
+    return session.query(*LISTING_COLUMNS).select_from(EducationalOrganization).outerjoin(
+        Region, EducationalOrganization.RegionId == Region.Id
+    ).outerjoin(
+        OrganizationForm, EducationalOrganization.FormId == OrganizationForm.Id
+    ).outerjoin(
+        OrganizationType, EducationalOrganization.TypeId == OrganizationType.Id
+    ).outerjoin(
+        OrganizationStats, EducationalOrganization.Id == OrganizationStats.OrganizationId
+    )
+
+
+# Одновременные одинаковые запросы списка и фасетов выполняются в БД один раз
+listing_flight = SingleFlight()
+
+
+def load_listing(filters, sort_field, sort_order, offset, limit):
+    with query_budget(), Session() as session:
+        # Количество считаем по ключам без присоединения справочников,
+        # страницу выбираем проекцией только отображаемых колонок
+        with phase('count'):
+            total_count = filter_organizations(session.query(EducationalOrganization.Id), filters).count()
+        with phase('filter_query'):
+            query = filter_organizations(listing_query(session), filters)
+            query = sort_organizations(query, sort_field, sort_order, join=False, q=filters['q'])
+            organizations = [OrganizationRow._make(row) for row in query.offset(offset).limit(limit)]
+    return total_count, organizations
+
+
+def load_facets():
+    # Получаем уникальные значения для фильтров
+    with Session() as session:
+        regions = session.query(Region.Id, Region.Name).order_by(Region.Name).all()
+
+        forms = session.query(OrganizationForm.Id, OrganizationForm.Name).order_by(OrganizationForm.Name).all()
+
+        program_names = [p[0] for p in session.query(
+            ProgramCatalogEntry.ProgrammName
+        ).distinct().all() if p[0]]
+
+        ugs_groups = session.query(UGS.Id, UGS.Name).order_by(UGS.Name).all()
+    return regions, forms, ugs_groups, program_names
+
 
 @app.route('/')
 def index():
     # Параметры пагинации и сортировки
-    page = request.args.get('page', 1, type=int)
+    page = page_arg(request.args, 'page')
     per_page = 20
-    sort_field = request.args.get('sort', 'Id')
-    sort_order = request.args.get('order', 'asc')
-
-    # Параметры фильтрации
-    region = request.args.get('region', '')
-    program_name = request.args.get('program_name', '')
-    ugs_name = request.args.get('ugs_name', '')
-    form_name = request.args.get('form_name', '')
-
-    with Session() as session:
-        # Базовый запрос организаций
-        query = session.query(EducationalOrganization)
-
-        # Применяем фильтры
-        if region:
-            query = query.filter(EducationalOrganization.RegionName.ilike(f'%{region}%'))
-        if form_name:
-            query = query.filter(EducationalOrganization.FormName.ilike(f'%{form_name}%'))
-
-        # Фильтры по связанным таблицам (программы)
-        if program_name or ugs_name:
-            query = query.join(
-                OrganizationProgramAssociation,
-                EducationalOrganization.Id == OrganizationProgramAssociation.organization_external_id
-            ).join(
-                EducationalProgram,
-                OrganizationProgramAssociation.program_external_id == EducationalProgram.Id
-            )
-            if program_name:
-                query = query.filter(EducationalProgram.ProgrammName.ilike(f'%{program_name}%'))
-            if ugs_name:
-                query = query.filter(EducationalProgram.UGSName.ilike(f'%{ugs_name}%'))
-
-        # Применяем сортировку
-        if sort_order == 'asc':
-            query = query.order_by(getattr(EducationalOrganization, sort_field).asc())
-        else:
-            query = query.order_by(getattr(EducationalOrganization, sort_field).desc())
-
-        # Ручная реализация пагинации
-        total_count = query.count()
-        total_pages = math.ceil(total_count / per_page)
-        offset = (page - 1) * per_page
-        organizations = query.offset(offset).limit(per_page).all()
-
-        # Получаем уникальные значения для фильтров
-        regions = session.query(
-            EducationalOrganization.RegionName
-        ).distinct().all()
-
-        forms = session.query(
-            EducationalOrganization.FormName
-        ).distinct().all()
-
-        program_names = session.query(
-            EducationalProgram.ProgrammName
-        ).distinct().all()
-
-        ugs_names = session.query(
-            EducationalProgram.UGSName
-        ).distinct().all()
+    sort_field, sort_order = parse_sort(request.args)
+    filters = parse_filters(request.args)
+
+    offset = (page - 1) * per_page
+    degraded = False
+    # При READ_MODEL=1 список и фильтры считаются по колоночной модели в памяти;
+    # нечеткий поиск выполняется только по триграммному индексу в БД
+    model = current_model(Session, DB_PATH) if not filters['q'] else None
+    if model is not None:
+        with phase('filter_query'):
+            total_count, rows = model.listing(filters, sort_field, sort_order, offset, per_page)
+            organizations = [OrganizationRow._make(row) for row in rows]
+        regions, forms, ugs_groups = model.regions, model.forms, model.ugs_groups
+        program_names = model.program_names
+    else:
+        listing_key = normalize_key('listing', sort_field, sort_order, offset, per_page, **filters)
+        try:
+            with phase('single_flight'):
+                (total_count, organizations), _ = listing_flight.do(
+                    listing_key, lambda: load_listing(filters, sort_field, sort_order, offset, per_page)
+                )
+        except BudgetExceeded:
+            # Деградированный ответ: фильтры и фасеты на месте, вместо списка - подсказка
+            degraded = True
+            total_count, organizations = 0, []
+        with phase('facets'):
+            (regions, forms, ugs_groups, program_names), _ = listing_flight.do(('facets',), load_facets)
+    total_pages = math.ceil(total_count / per_page)
 
     # Рассчитываем диапазон страниц для отображения
     start_page = max(1, page - 4)
@@ -98,40 +294,467 @@ def index():
     # Формируем список страниц для отображения
     page_range = list(range(start_page, end_page + 1))
 
-    return render_template(
-        'index.html',
-        organizations=organizations,
-        page=page,
-        per_page=per_page,
-        total_pages=total_pages,
-        total_count=total_count,
-        page_range=page_range,
-        regions=[r[0] for r in regions if r[0]],
-        program_names=[p[0] for p in program_names if p[0]],
-        ugs_names=[u[0] for u in ugs_names if u[0]],
-        forms=[f[0] for f in forms if f[0]],
-        sort_field=sort_field,
-        sort_order=sort_order,
-        current_filters={
-            'region': region,
-            'program_name': program_name,
-            'ugs_name': ugs_name,
-            'form_name': form_name
-        }
+    with phase('render'):
+        return render_template(
+            'index.html',
+            organizations=organizations,
+            page=page,
+            per_page=per_page,
+            total_pages=total_pages,
+            total_count=total_count,
+            page_range=page_range,
+            regions=regions,
+            program_names=program_names,
+            ugs_groups=ugs_groups,
+            forms=forms,
+            sort_field=sort_field,
+            sort_order=sort_order,
+            current_filters=filters,
+            degraded=degraded
+        ), 503 if degraded else 200
+
+
+def organization_to_dict(org):
+    return {
+        'Id': org.Id,
+        'FullName': org.FullName,
+        'ShortName': org.ShortName,
+        'IsBranch': org.IsBranch,
+        'HeadEduOrgId': org.HeadEduOrgId or None,
+        'RegionName': org.RegionName,
+        'FederalDistrictName': org.FederalDistrictName,
+        'FormName': org.FormName,
+        'KindName': org.KindName,
+        'TypeName': org.TypeName,
+        'PostAddress': org.PostAddress,
+        'Phone': org.Phone,
+        'Email': org.Email,
+        'WebSite': org.WebSite,
+        'OGRN': org.OGRN,
+        'INN': org.INN,
+        'KPP': org.KPP,
+        'ProgramCount': org.stats.ProgramCount if org.stats else 0,
+        'AccreditedCount': org.stats.AccreditedCount if org.stats else 0,
+        'UGSCount': org.stats.UGSCount if org.stats else 0,
+    }
+
+
+def program_to_dict(program):
+    return {
+        'Id': program.Id,
+        'ProgrammName': program.ProgrammName,
+        'ProgrammCode': program.ProgrammCode,
+        'EduLevelName': program.EduLevelName,
+        'UGSCode': program.UGSCode,
+        'UGSName': program.UGSName,
+        'Qualification': program.Qualification,
+        'EduNormativePeriod': program.EduNormativePeriod,
+        'IsAccredited': program.IsAccredited,
+        'IsCanceled': program.IsCanceled,
+        'IsSuspended': program.IsSuspended,
+    }
+
+
+@app.route('/api/organizations')
+def api_organizations():
+    # Тот же список, что и на главной странице, в JSON с теми же фильтрами
+    page = page_arg(request.args, 'page')
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+    sort_field, sort_order = parse_sort(request.args)
+    filters = parse_filters(request.args)
+
+    with Session() as session:
+        query = filter_organizations(session.query(EducationalOrganization), filters)
+        query = sort_organizations(query, sort_field, sort_order, q=filters['q'])
+        try:
+            with query_budget():
+                with phase('count'):
+                    total_count = query.count()
+                with phase('filter_query'):
+                    organizations = query.offset((page - 1) * per_page).limit(per_page).all()
+        except BudgetExceeded as e:
+            response = jsonify({'error': str(e), 'hint': 'Уточните фильтры'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '30'
+            return response
+        return jsonify({
+            'page': page,
+            'per_page': per_page,
+            'total_count': total_count,
+            'items': [organization_to_dict(org) for org in organizations],
+        })
+
+
+def load_organization_tree(session, org_id):
+    # Организация, ее головные организации и филиалы всех уровней по таблице замыкания
+    org = session.get(EducationalOrganization, org_id)
+    if org is None:
+        abort(404)
+    parents = session.query(EducationalOrganization).join(
+        OrganizationHierarchy, OrganizationHierarchy.AncestorId == EducationalOrganization.Id
+    ).filter(
+        OrganizationHierarchy.DescendantId == org_id, OrganizationHierarchy.Depth > 0
+    ).order_by(OrganizationHierarchy.Depth).all()
+    branches = session.query(EducationalOrganization).join(
+        OrganizationHierarchy, OrganizationHierarchy.DescendantId == EducationalOrganization.Id
+    ).filter(
+        OrganizationHierarchy.AncestorId == org_id, OrganizationHierarchy.Depth > 0
+    ).order_by(OrganizationHierarchy.Depth, EducationalOrganization.FullName).all()
+    return org, parents, branches
+
+
+def organization_programs(session, org_id, with_branch_programs):
+    # Программы организации (или всего поддерева с филиалами) вместе с владельцем;
+    # каталог присоединен явно, чтобы по нему фильтровать и сортировать
+    query = session.query(EducationalProgram, OrganizationProgramAssociation.organization_external_id).join(
+        OrganizationProgramAssociation,
+        EducationalProgram.Id == OrganizationProgramAssociation.program_external_id
+    ).join(
+        ProgramCatalogEntry, OrganizationProgramAssociation.CatalogId == ProgramCatalogEntry.Id
     )
+    if with_branch_programs:
+        return query.join(
+            OrganizationHierarchy,
+            OrganizationHierarchy.DescendantId == OrganizationProgramAssociation.organization_external_id
+        ).filter(OrganizationHierarchy.AncestorId == org_id)
+    return query.filter(OrganizationProgramAssociation.organization_external_id == org_id)
+
+
+PROGRAMS_PER_PAGE = 50
+
+PROGRAM_STATUS_FILTERS = {
+    'accredited': EducationalProgram.IsAccredited,
+    'active': EducationalProgram.IsActive,
+    'canceled': EducationalProgram.IsCanceled,
+    'suspended': EducationalProgram.IsSuspended,
+}
+
+PROGRAM_SORT_FIELDS = {
+    'name': ProgramCatalogEntry.ProgrammName,
+    'code': ProgramCatalogEntry.ProgrammCode,
+    'level': EduLevel.Name,
+}
+
+
+def parse_program_filters(args):
+    return {
+        'branches': args.get('branches', 0, type=bounded_int),
+        'level_id': args.get('level_id', type=bounded_int),
+        'status': args.get('status', ''),
+        'sort': args.get('sort', 'name'),
+    }
+
+
+def program_filter_args(filters):
+    # Параметры фильтров для ссылок на следующие страницы без пустых значений
+    return {key: value for key, value in filters.items() if value}
+
+
+def program_page(session, org_id, filters, page):
+    # Одна страница таблицы программ и общее число программ с учетом фильтров
+    query = organization_programs(session, org_id, filters['branches'])
+    if filters['level_id']:
+        query = query.filter(ProgramCatalogEntry.EduLevelId == filters['level_id'])
+    if filters['status'] in PROGRAM_STATUS_FILTERS:
+        query = query.filter(PROGRAM_STATUS_FILTERS[filters['status']])
+    total_count = query.count()
+    sort_column = PROGRAM_SORT_FIELDS.get(filters['sort'], PROGRAM_SORT_FIELDS['name'])
+    if filters['sort'] == 'level':
+        query = query.outerjoin(EduLevel, ProgramCatalogEntry.EduLevelId == EduLevel.Id)
+    rows = query.order_by(sort_column, EducationalProgram.Id).offset(
+        (page - 1) * PROGRAMS_PER_PAGE
+    ).limit(PROGRAMS_PER_PAGE).all()
+    return [program for program, _ in rows], total_count
 
 
 @app.route('/organization/<org_id>')
 def organization_detail(org_id):
+    filters = parse_program_filters(request.args)
+    page = page_arg(request.args, 'programs_page')
+    with Session() as session:
+        with phase('organization'):
+            org, parents, branches = load_organization_tree(session, org_id)
+        with phase('programs'):
+            programs, total_count = program_page(session, org_id, filters, page)
+        levels = session.query(EduLevel.Id, EduLevel.Name).order_by(EduLevel.Name).all()
+    with phase('render'):
+        return render_template(
+            'organization.html',
+            organization=org,
+            parents=parents,
+            branches=branches,
+            programs=programs,
+            programs_total=total_count,
+            programs_page=page,
+            has_more=page * PROGRAMS_PER_PAGE < total_count,
+            levels=levels,
+            program_filters=filters,
+            program_args=program_filter_args(filters)
+        )
+
+
+@app.route('/organization/<org_id>/programs')
+def organization_programs_fragment(org_id):
+    # Следующая страница строк таблицы программ для подгрузки по кнопке
+    filters = parse_program_filters(request.args)
+    page = page_arg(request.args, 'programs_page')
+    with Session() as session:
+        with phase('programs'):
+            programs, total_count = program_page(session, org_id, filters, page)
+    with phase('render'):
+        html = render_template('organization_programs.html', programs=programs)
+    response = app.make_response(html)
+    if page * PROGRAMS_PER_PAGE < total_count:
+        response.headers['X-Next-Page'] = url_for(
+            'organization_detail', org_id=org_id, programs_page=page + 1, **program_filter_args(filters))
+        response.headers['X-Next-Fragment'] = url_for(
+            'organization_programs_fragment', org_id=org_id, programs_page=page + 1, **program_filter_args(filters))
+    return response
+
+
+def group_stats_to_dict(stats, name, short_name=None):
+    data = {
+        'Name': name,
+        'OrganizationCount': stats.OrganizationCount,
+        'BranchCount': stats.BranchCount,
+        'ProgramCount': stats.ProgramCount,
+        'AccreditedCount': stats.AccreditedCount,
+        'UGSCount': stats.UGSCount,
+    }
+    if short_name is not None:
+        data['ShortName'] = short_name
+    return data
+
+
+@app.route('/api/statistics')
+def api_statistics():
+    # Статистика по регионам и федеральным округам из таблиц, посчитанных при загрузке
+    model = current_model(Session, DB_PATH)
+    if model is not None:
+        return jsonify({
+            'regions': [
+                dict(group_stats_to_dict(stats, stats.Name), RegionId=stats.Id)
+                for stats in model.region_stats
+            ],
+            'federal_districts': [
+                dict(group_stats_to_dict(stats, stats.Name, stats.ShortName), FederalDistrictId=stats.Id)
+                for stats in model.district_stats
+            ],
+        })
+    with Session() as session:
+        regions = session.query(RegionStats).order_by(RegionStats.OrganizationCount.desc()).all()
+        districts = session.query(FederalDistrictStats).order_by(FederalDistrictStats.OrganizationCount.desc()).all()
+        return jsonify({
+            'regions': [
+                dict(group_stats_to_dict(stats, stats.region.Name), RegionId=stats.RegionId)
+                for stats in regions
+            ],
+            'federal_districts': [
+                dict(group_stats_to_dict(stats, stats.federal_district.Name, stats.federal_district.ShortName),
+                     FederalDistrictId=stats.FederalDistrictId)
+                for stats in districts
+            ],
+        })
+
+
+@app.route('/api/organizations/<org_id>')
+def api_organization(org_id):
+    # Организация со всеми филиалами и программами организации и филиалов
     with Session() as session:
-        org = session.query(EducationalOrganization).get(org_id)
-        programs = session.query(EducationalProgram).join(
-            OrganizationProgramAssociation,
-            EducationalProgram.Id == OrganizationProgramAssociation.program_external_id
-        ).filter(
-            OrganizationProgramAssociation.organization_external_id == org_id
-        ).all()
-    return render_template('organization.html', organization=org, programs=programs)
+        with phase('organization'):
+            org, parents, branches = load_organization_tree(session, org_id)
+        with phase('programs'):
+            rows = organization_programs(session, org_id, True).all()
+        data = organization_to_dict(org)
+        data['parents'] = [organization_to_dict(parent) for parent in parents]
+        data['branches'] = [organization_to_dict(branch) for branch in branches]
+        data['programs'] = [
+            dict(program_to_dict(program), OrganizationId=owner_id)
+            for program, owner_id in rows
+        ]
+        return jsonify(data)
+
+
+# Пакетная сверка по идентификаторам: не больше MAX_LOOKUP_IDS значений за запрос,
+# запросы с IN разбиваются на части по LOOKUP_CHUNK_SIZE параметров
+MAX_LOOKUP_IDS = 5000
+LOOKUP_CHUNK_SIZE = 500
+LOOKUP_FIELDS = {
+    'inn': EducationalOrganization.INN,
+    'ogrn': EducationalOrganization.OGRN,
+    'kpp': EducationalOrganization.KPP,
+}
+
+
+# Колонки program_to_dict для выборки без ORM-объектов; Status - последней
+LOOKUP_PROGRAM_COLUMNS = (
+    EducationalProgram.Id,
+    ProgramCatalogEntry.ProgrammName,
+    ProgramCatalogEntry.ProgrammCode,
+    EduLevel.Name,
+    ProgramCatalogEntry.UGSCode,
+    UGS.Name,
+    Qualification.Name,
+    EducationalProgram.EduNormativePeriod,
+    EducationalProgram.Status,
+)
+
+
+def program_row_to_dict(row):
+    *values, status = row
+    data = dict(zip(('Id', 'ProgrammName', 'ProgrammCode', 'EduLevelName', 'UGSCode', 'UGSName',
+                     'Qualification', 'EduNormativePeriod'), values))
+    data['IsAccredited'] = bool(status & STATUS_ACCREDITED)
+    data['IsCanceled'] = bool(status & STATUS_CANCELED)
+    data['IsSuspended'] = bool(status & STATUS_SUSPENDED)
+    return data
+
+
+def chunks(values, size=LOOKUP_CHUNK_SIZE):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+@app.route('/api/organizations/lookup', methods=['POST'])
+def api_organizations_lookup():
+    # Тело: {"inn": [...], "ogrn": [...], "kpp": [...]} - организации, совпавшие
+    # хотя бы по одному значению, вместе с их программами за один запрос
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Ожидается JSON-объект с полями inn, ogrn, kpp'}), 400
+    wanted = {}
+    for name in LOOKUP_FIELDS:
+        values = payload.get(name, [])
+        if not isinstance(values, list):
+            return jsonify({'error': f'Поле {name} должно быть списком'}), 400
+        wanted[name] = list(dict.fromkeys(str(value).strip() for value in values if str(value).strip()))
+    if sum(len(values) for values in wanted.values()) > MAX_LOOKUP_IDS:
+        return jsonify({'error': f'Не больше {MAX_LOOKUP_IDS} идентификаторов за запрос'}), 400
+
+    with Session() as session:
+        organizations = {}
+        with phase('organizations'):
+            for name, column in LOOKUP_FIELDS.items():
+                for part in chunks(wanted[name]):
+                    for org in session.query(EducationalOrganization).filter(column.in_(part)):
+                        organizations[org.Id] = org
+        programs = {org_id: [] for org_id in organizations}
+        with phase('programs'):
+            # Программы выбираются проекцией колонок: на тысячах организаций
+            # создание ORM-объектов с каталогом и справочниками дороже запроса
+            for part in chunks(list(organizations)):
+                rows = session.query(
+                    OrganizationProgramAssociation.organization_external_id, *LOOKUP_PROGRAM_COLUMNS
+                ).select_from(OrganizationProgramAssociation).join(
+                    EducationalProgram, EducationalProgram.Id == OrganizationProgramAssociation.program_external_id
+                ).join(
+                    ProgramCatalogEntry, ProgramCatalogEntry.Id == EducationalProgram.CatalogId
+                ).outerjoin(
+                    EduLevel, EduLevel.Id == ProgramCatalogEntry.EduLevelId
+                ).outerjoin(
+                    UGS, UGS.Id == ProgramCatalogEntry.UGSId
+                ).outerjoin(
+                    Qualification, Qualification.Id == ProgramCatalogEntry.QualificationId
+                ).filter(OrganizationProgramAssociation.organization_external_id.in_(part))
+                for owner_id, *row in rows:
+                    programs[owner_id].append(program_row_to_dict(row))
+
+        items = []
+        for org_id in sorted(organizations):
+            data = organization_to_dict(organizations[org_id])
+            data['programs'] = programs[org_id]
+            items.append(data)
+        found = {name: {getattr(org, column.key) for org in organizations.values()}
+                 for name, column in LOOKUP_FIELDS.items()}
+        return jsonify({
+            'items': items,
+            'not_found': {name: [value for value in wanted[name] if value not in found[name]]
+                          for name in LOOKUP_FIELDS},
+        })
+
+
+# Изменения отдаются страницами по CHANGES_PAGE_SIZE записей журнала
+CHANGES_PAGE_SIZE = 1000
+
+
+def data_load_to_dict(load):
+    return {
+        'Id': load.Id,
+        'ArchiveName': load.ArchiveName,
+        'LoadedAt': load.LoadedAt.isoformat(timespec='seconds'),
+        'AddedCount': load.AddedCount,
+        'ChangedCount': load.ChangedCount,
+        'RemovedCount': load.RemovedCount,
+    }
+
+
+@app.route('/api/changes')
+def api_changes():
+    # Изменения после загрузки since (Id из data_loads, 0 - с самого начала).
+    # Если записей больше страницы, next - значение after для следующего запроса;
+    # когда next = null, потребитель запоминает latest_load как новый since
+    since = max(request.args.get('since', 0, type=bounded_int), 0)
+    after = max(request.args.get('after', 0, type=bounded_int), 0)
+    with Session() as session:
+        loads = session.query(DataLoad).filter(DataLoad.Id > since).order_by(DataLoad.Id).all()
+        latest_load = session.query(func.max(DataLoad.Id)).scalar()
+        with phase('changes'):
+            entries = session.query(ChangeLogEntry).filter(
+                ChangeLogEntry.LoadId > since, ChangeLogEntry.Id > after
+            ).order_by(ChangeLogEntry.Id).limit(CHANGES_PAGE_SIZE + 1).all()
+        has_more = len(entries) > CHANGES_PAGE_SIZE
+        entries = entries[:CHANGES_PAGE_SIZE]
+        return jsonify({
+            'since': since,
+            'latest_load': latest_load,
+            'loads': [data_load_to_dict(load) for load in loads],
+            'changes': [{
+                'Id': entry.Id,
+                'LoadId': entry.LoadId,
+                'EntityType': entry.EntityType,
+                'EntityId': entry.EntityId,
+                'Action': entry.Action,
+                'Data': json.loads(entry.Data) if entry.Data else None,
+            } for entry in entries],
+            'next': entries[-1].Id if has_more else None,
+        })
+
+
+@app.route('/api/history/<entity_type>/<path:entity_id>')
+def api_history(entity_type, entity_id):
+    # Без at - список загрузок, в которых запись менялась; с at=ГГГГ-ММ-ДД
+    # (или с временем) - состояние записи на конец этого момента по истории загрузок
+    if entity_type not in ENTITY_TYPES:
+        abort(404)
+    at = request.args.get('at')
+    with Session() as session:
+        if not at:
+            return jsonify({
+                'EntityType': entity_type,
+                'EntityId': entity_id,
+                'versions': [dict(data_load_to_dict(load), Action=action)
+                             for load, action in entity_versions(session, entity_type, entity_id)],
+            })
+        try:
+            moment = datetime.fromisoformat(at)
+        except ValueError:
+            return jsonify({'error': 'Параметр at - дата в формате ГГГГ-ММ-ДД'}), 400
+        if len(at) == 10:
+            # Дата без времени - состояние на конец дня
+            moment = moment.replace(hour=23, minute=59, second=59)
+        load = load_at(session, moment)
+        if load is None:
+            return jsonify({'error': 'На эту дату загрузок не было'}), 404
+        with phase('history'):
+            data = entity_at(session, entity_type, entity_id, load.Id)
+        return jsonify({
+            'EntityType': entity_type,
+            'EntityId': entity_id,
+            'at': at,
+            'load': data_load_to_dict(load),
+            'exists': data is not None,
+            'Data': data,
+        })
 
 
 if __name__ == '__main__':
@@ -148,372 +771,7 @@ if __name__ == '__main__':
     <title>Реестр образовательных организаций</title>
     <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css">
     <link href="https://fonts.googleapis.com/css2?family=Roboto:wght@300;400;500;700&family=Montserrat:wght@600;700&display=swap" rel="stylesheet">
-    <style>
-        :root {
-            --primary: #2c3e50;
-            --secondary: #3498db;
-            --accent: #e74c3c;
-            --light: #ecf0f1;
-            --dark: #34495e;
-            --success: #27ae60;
-            --warning: #f39c12;
-            --card-shadow: 0 8px 30px rgba(0, 0, 0, 0.12);
-            --hover-shadow: 0 12px 40px rgba(0, 0, 0, 0.15);
-        }
-
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-
-        body {
-            font-family: 'Roboto', sans-serif;
-            background: linear-gradient(135deg, #f5f7fa 0%, #e4edf5 100%);
-            color: #333;
-            line-height: 1.6;
-            padding: 20px;
-            min-height: 100vh;
-        }
-
-        .container {
-            max-width: 1200px;
-            margin: 0 auto;
-        }
-
-        header {
-            text-align: center;
-            margin-bottom: 30px;
-            padding: 20px;
-            background: white;
-            border-radius: 15px;
-            box-shadow: var(--card-shadow);
-            position: relative;
-            overflow: hidden;
-        }
-
-        header::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            width: 100%;
-            height: 5px;
-            background: linear-gradient(90deg, var(--secondary), var(--success), var(--warning));
-        }
-
-        h1 {
-            font-family: 'Montserrat', sans-serif;
-            color: var(--primary);
-            font-size: 2.5rem;
-            margin-bottom: 10px;
-        }
-
-        .subtitle {
-            color: var(--dark);
-            font-size: 1.1rem;
-            max-width: 700px;
-            margin: 0 auto 15px;
-        }
-
-        .stats {
-            display: flex;
-            justify-content: center;
-            gap: 20px;
-            margin-top: 15px;
-        }
-
-        .stat-card {
-            background: white;
-            padding: 15px 20px;
-            border-radius: 10px;
-            box-shadow: 0 4px 10px rgba(0, 0, 0, 0.08);
-            text-align: center;
-            min-width: 150px;
-        }
-
-        .stat-value {
-            font-size: 1.8rem;
-            font-weight: 700;
-            color: var(--secondary);
-            margin-bottom: 5px;
-        }
-
-        .stat-label {
-            color: var(--dark);
-            font-size: 0.9rem;
-        }
-
-        .filters {
-            background: white;
-            padding: 25px;
-            border-radius: 15px;
-            margin-bottom: 30px;
-            box-shadow: var(--card-shadow);
-        }
-
-        .filter-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(240px, 1fr));
-            gap: 20px;
-            margin-bottom: 20px;
-        }
-
-        .filter-group {
-            margin-bottom: 0;
-        }
-
-        label {
-            display: block;
-            margin-bottom: 8px;
-            font-weight: 500;
-            color: var(--primary);
-        }
-
-        select {
-            width: 100%;
-            padding: 12px 15px;
-            border: 2px solid #e0e6ed;
-            border-radius: 8px;
-            background: white;
-            font-size: 16px;
-            transition: all 0.3s;
-            appearance: none;
-            background-image: url("data:image/svg+xml;charset=UTF-8,%3csvg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 24 24' fill='none' stroke='currentColor' stroke-width='2' stroke-linecap='round' stroke-linejoin='round'%3e%3cpolyline points='6 9 12 15 18 9'%3e%3c/polyline%3e%3c/svg%3e");
-            background-repeat: no-repeat;
-            background-position: right 1rem center;
-            background-size: 1em;
-        }
-
-        select:focus {
-            border-color: var(--secondary);
-            outline: none;
-            box-shadow: 0 0 0 3px rgba(52, 152, 219, 0.2);
-        }
-
-        .filter-actions {
-            display: flex;
-            justify-content: flex-end;
-            gap: 15px;
-            margin-top: 10px;
-        }
-
-        .btn {
-            padding: 12px 25px;
-            border: none;
-            border-radius: 8px;
-            font-size: 16px;
-            font-weight: 500;
-            cursor: pointer;
-            transition: all 0.3s;
-            display: inline-flex;
-            align-items: center;
-            justify-content: center;
-            gap: 8px;
-        }
-
-        .btn-primary {
-            background: var(--secondary);
-            color: white;
-            box-shadow: 0 4px 10px rgba(52, 152, 219, 0.3);
-        }
-
-        .btn-primary:hover {
-            background: #2980b9;
-            transform: translateY(-2px);
-            box-shadow: 0 6px 15px rgba(52, 152, 219, 0.4);
-        }
-
-        .btn-reset {
-            background: #f0f3f7;
-            color: var(--dark);
-        }
-
-        .btn-reset:hover {
-            background: #e0e6ed;
-            transform: translateY(-2px);
-        }
-
-        .table-container {
-            background: white;
-            border-radius: 15px;
-            overflow: hidden;
-            box-shadow: var(--card-shadow);
-            margin-bottom: 30px;
-        }
-
-        table {
-            width: 100%;
-            border-collapse: collapse;
-        }
-
-        thead {
-            background: linear-gradient(to right, var(--primary), var(--dark));
-            color: white;
-        }
-
-        th {
-            padding: 18px 20px;
-            text-align: left;
-            font-weight: 600;
-            font-size: 16px;
-            position: relative;
-            cursor: pointer;
-            transition: background 0.3s;
-        }
-
-        th:hover {
-            background: rgba(0, 0, 0, 0.2);
-        }
-
-        th.sorted-asc::after {
-            content: "▲";
-            position: absolute;
-            right: 15px;
-            font-size: 14px;
-        }
-
-        th.sorted-desc::after {
-            content: "▼";
-            position: absolute;
-            right: 15px;
-            font-size: 14px;
-        }
-
-        tbody tr {
-            border-bottom: 1px solid #f0f3f7;
-            transition: background 0.2s;
-        }
-
-        tbody tr:hover {
-            background: #f8fafc;
-        }
-
-        td {
-            padding: 16px 20px;
-            color: #2d3748;
-        }
-
-        .org-name {
-            font-weight: 500;
-            color: var(--primary);
-            transition: color 0.2s;
-        }
-
-        a {
-            text-decoration: none;
-            color: inherit;
-        }
-
-        .org-name:hover {
-            color: var(--secondary);
-        }
-
-        .contacts {
-            font-size: 14px;
-            color: #4a5568;
-        }
-
-        .pagination-container {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            flex-wrap: wrap;
-            gap: 20px;
-            background: white;
-            padding: 20px;
-            border-radius: 15px;
-            box-shadow: var(--card-shadow);
-        }
-
-        .pagination-info {
-            font-size: 15px;
-            color: var(--dark);
-            font-weight: 500;
-        }
-
-        .pagination {
-            display: flex;
-            gap: 8px;
-            flex-wrap: wrap;
-        }
-
-        .page-item {
-            list-style: none;
-        }
-
-        .page-link {
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            width: 40px;
-            height: 40px;
-            border-radius: 10px;
-            background: white;
-            color: var(--primary);
-            font-weight: 500;
-            text-decoration: none;
-            border: 2px solid #e0e6ed;
-            transition: all 0.3s;
-        }
-
-        .page-link:hover {
-            background: #f0f3f7;
-            transform: translateY(-2px);
-        }
-
-        .page-link.active {
-            background: var(--secondary);
-            color: white;
-            border-color: var(--secondary);
-        }
-
-        .page-link.disabled {
-            opacity: 0.5;
-            cursor: not-allowed;
-        }
-
-        .page-link.jump {
-            width: auto;
-            padding: 0 15px;
-        }
-
-        footer {
-            text-align: center;
-            margin-top: 40px;
-            padding: 20px;
-            color: #718096;
-            font-size: 14px;
-        }
-
-        @media (max-width: 768px) {
-            .filter-grid {
-                grid-template-columns: 1fr;
-            }
-
-            .filter-actions {
-                flex-direction: column;
-            }
-
-            .pagination-container {
-                flex-direction: column;
-            }
-
-            h1 {
-                font-size: 2rem;
-            }
-
-            .stats {
-                flex-direction: column;
-                align-items: center;
-            }
-
-            .stat-card {
-                width: 100%;
-                max-width: 300px;
-            }
-        }
-    </style>
+    <link rel="stylesheet" href="{{ asset_url('css/index.css') }}">
 </head>
 <body>
     <div class="container">
@@ -541,24 +799,30 @@ if __name__ == '__main__':
             <form method="GET">
                 <div class="filter-grid">
                     <div class="filter-group">
-                        <label for="region"><i class="fas fa-map-marker-alt"></i> Регион:</label>
-                        <select id="region" name="region">
+                        <label for="q"><i class="fas fa-search"></i> Название:</label>
+                        <input type="search" id="q" name="q" value="{{ current_filters.q }}"
+                               placeholder="Например, мгу или политех">
+                    </div>
+
+                    <div class="filter-group">
+                        <label for="region_id"><i class="fas fa-map-marker-alt"></i> Регион:</label>
+                        <select id="region_id" name="region_id">
                             <option value="">Все регионы</option>
                             {% for region in regions %}
-                                <option value="{{ region }}" {% if current_filters.region == region %}selected{% endif %}>
-                                    {{ region }}
+                                <option value="{{ region.Id }}" {% if current_filters.region_id == region.Id %}selected{% endif %}>
+                                    {{ region.Name }}
                                 </option>
                             {% endfor %}
                         </select>
                     </div>
 
                     <div class="filter-group">
-                        <label for="form_name"><i class="fas fa-user-graduate"></i> Форма обучения:</label>
-                        <select id="form_name" name="form_name">
+                        <label for="form_id"><i class="fas fa-user-graduate"></i> Форма обучения:</label>
+                        <select id="form_id" name="form_id">
                             <option value="">Все формы</option>
                             {% for form in forms %}
-                                <option value="{{ form }}" {% if current_filters.form_name == form %}selected{% endif %}>
-                                    {{ form }}
+                                <option value="{{ form.Id }}" {% if current_filters.form_id == form.Id %}selected{% endif %}>
+                                    {{ form.Name }}
                                 </option>
                             {% endfor %}
                         </select>
@@ -577,16 +841,33 @@ if __name__ == '__main__':
                     </div>
 
                     <div class="filter-group">
-                        <label for="ugs_name"><i class="fas fa-layer-group"></i> Укрупненная группа специальностей:</label>
-                        <select id="ugs_name" name="ugs_name">
+                        <label for="ugs_id"><i class="fas fa-layer-group"></i> Укрупненная группа специальностей:</label>
+                        <select id="ugs_id" name="ugs_id">
                             <option value="">Все группы</option>
-                            {% for ugs in ugs_names %}
-                                <option value="{{ ugs }}" {% if current_filters.ugs_name == ugs %}selected{% endif %}>
-                                    {{ ugs }}
+                            {% for ugs in ugs_groups %}
+                                <option value="{{ ugs.Id }}" {% if current_filters.ugs_id == ugs.Id %}selected{% endif %}>
+                                    {{ ugs.Name }}
                                 </option>
                             {% endfor %}
                         </select>
                     </div>
+
+                    <div class="filter-group">
+                        <label for="min_programs"><i class="fas fa-list-ol"></i> Программ не меньше:</label>
+                        <input type="number" id="min_programs" name="min_programs" min="0"
+                               value="{{ current_filters.min_programs or '' }}">
+                    </div>
+                </div>
+
+                <div class="filter-checks">
+                    <label>
+                        <input type="checkbox" name="accredited" value="1" {% if current_filters.accredited %}checked{% endif %}>
+                        Только с аккредитованными программами
+                    </label>
+                    <label>
+                        <input type="checkbox" name="active" value="1" {% if current_filters.active %}checked{% endif %}>
+                        Без приостановленных и отмененных программ
+                    </label>
                 </div>
 
                 <div class="filter-actions">
@@ -620,6 +901,18 @@ if __name__ == '__main__':
                             {% if sort_field == 'TypeName' %}class="sorted-{{ sort_order }}"{% endif %}>
                             Тип организации
                         </th>
+                        <th onclick="sortTable('ProgramCount')" 
+                            {% if sort_field == 'ProgramCount' %}class="sorted-{{ sort_order }}"{% endif %}>
+                            Программ
+                        </th>
+                        <th onclick="sortTable('AccreditedCount')" 
+                            {% if sort_field == 'AccreditedCount' %}class="sorted-{{ sort_order }}"{% endif %}>
+                            Аккредитовано
+                        </th>
+                        <th onclick="sortTable('UGSCount')" 
+                            {% if sort_field == 'UGSCount' %}class="sorted-{{ sort_order }}"{% endif %}>
+                            УГС
+                        </th>
                         <th>Контакты</th>
                     </tr>
                 </thead>
@@ -628,12 +921,15 @@ if __name__ == '__main__':
                     <tr>
                         <td>
                             <a href="{{ url_for('organization_detail', org_id=org.Id) }}" class="org-name">
-                                <i class="fas fa-school"></i> {{ org.ShortName or org.FullName }}
+                                <i class="fas fa-school"></i> {{ org.DisplayName }}
                             </a>
                         </td>
                         <td>{{ org.RegionName }}</td>
                         <td>{{ org.FormName }}</td>
                         <td>{{ org.TypeName }}</td>
+                        <td>{{ org.ProgramCount }}</td>
+                        <td>{{ org.AccreditedCount }}</td>
+                        <td>{{ org.UGSCount }}</td>
                         <td class="contacts">
                             {% if org.Phone %}
                                 <div><i class="fas fa-phone"></i> {{ org.Phone }}</div>
@@ -645,10 +941,16 @@ if __name__ == '__main__':
                     </tr>
                     {% else %}
                     <tr>
-                        <td colspan="5" style="text-align: center; padding: 30px;">
+                        <td colspan="8" style="text-align: center; padding: 30px;">
+                            {% if degraded %}
+                            <i class="fas fa-hourglass-half" style="font-size: 40px; margin-bottom: 15px; color: #ccc;"></i>
+                            <h3 style="color: #777;">Запрос выполняется слишком долго</h3>
+                            <p>Уточните фильтры: например, выберите регион или группу специальностей</p>
+                            {% else %}
                             <i class="fas fa-search" style="font-size: 40px; margin-bottom: 15px; color: #ccc;"></i>
                             <h3 style="color: #777;">Организации не найдены</h3>
                             <p>Попробуйте изменить параметры фильтрации</p>
+                            {% endif %}
                         </td>
                     </tr>
                     {% endfor %}
@@ -664,12 +966,12 @@ if __name__ == '__main__':
             <ul class="pagination">
                 {% if page > 1 %}
                     <li class="page-item">
-                        <a class="page-link jump" href="{{ url_for('index', page=1, sort=sort_field, order=sort_order, region=current_filters.region, form_name=current_filters.form_name, program_name=current_filters.program_name, ugs_name=current_filters.ugs_name) }}">
+                        <a class="page-link jump" href="{{ url_for('index', page=1, sort=sort_field, order=sort_order, **current_filters) }}">
                             <i class="fas fa-angle-double-left"></i> Первая
                         </a>
                     </li>
                     <li class="page-item">
-                        <a class="page-link" href="{{ url_for('index', page=page-1, sort=sort_field, order=sort_order, region=current_filters.region, form_name=current_filters.form_name, program_name=current_filters.program_name, ugs_name=current_filters.ugs_name) }}">
+                        <a class="page-link" href="{{ url_for('index', page=page-1, sort=sort_field, order=sort_order, **current_filters) }}">
                             <i class="fas fa-angle-left"></i>
                         </a>
                     </li>
@@ -677,7 +979,7 @@ if __name__ == '__main__':
 
                 {% for p in page_range %}
                     <li class="page-item">
-                        <a class="page-link {% if p == page %}active{% endif %}" href="{{ url_for('index', page=p, sort=sort_field, order=sort_order, region=current_filters.region, form_name=current_filters.form_name, program_name=current_filters.program_name, ugs_name=current_filters.ugs_name) }}">
+                        <a class="page-link {% if p == page %}active{% endif %}" href="{{ url_for('index', page=p, sort=sort_field, order=sort_order, **current_filters) }}">
                             {{ p }}
                         </a>
                     </li>
@@ -685,12 +987,12 @@ if __name__ == '__main__':
 
                 {% if page < total_pages %}
                     <li class="page-item">
-                        <a class="page-link" href="{{ url_for('index', page=page+1, sort=sort_field, order=sort_order, region=current_filters.region, form_name=current_filters.form_name, program_name=current_filters.program_name, ugs_name=current_filters.ugs_name) }}">
+                        <a class="page-link" href="{{ url_for('index', page=page+1, sort=sort_field, order=sort_order, **current_filters) }}">
                             <i class="fas fa-angle-right"></i>
                         </a>
                     </li>
                     <li class="page-item">
-                        <a class="page-link jump" href="{{ url_for('index', page=total_pages, sort=sort_field, order=sort_order, region=current_filters.region, form_name=current_filters.form_name, program_name=current_filters.program_name, ugs_name=current_filters.ugs_name) }}">
+                        <a class="page-link jump" href="{{ url_for('index', page=total_pages, sort=sort_field, order=sort_order, **current_filters) }}">
                             Последняя <i class="fas fa-angle-double-right"></i>
                         </a>
                     </li>
@@ -734,295 +1036,7 @@ if __name__ == '__main__':
     <title>{{ organization.ShortName or organization.FullName }}</title>
     <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css">
     <link href="https://fonts.googleapis.com/css2?family=Roboto:wght@300;400;500;700&family=Montserrat:wght@600;700&display=swap" rel="stylesheet">
-    <style>
-        :root {
-            --primary: #2c3e50;
-            --secondary: #3498db;
-            --accent: #e74c3c;
-            --light: #ecf0f1;
-            --dark: #34495e;
-            --success: #27ae60;
-            --warning: #f39c12;
-            --card-shadow: 0 8px 30px rgba(0, 0, 0, 0.12);
-            --hover-shadow: 0 12px 40px rgba(0, 0, 0, 0.15);
-        }
-
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-
-        body {
-            font-family: 'Roboto', sans-serif;
-            background: linear-gradient(135deg, #f5f7fa 0%, #e4edf5 100%);
-            color: #333;
-            line-height: 1.6;
-            padding: 20px;
-            min-height: 100vh;
-        }
-
-        .container {
-            max-width: 1000px;
-            margin: 0 auto;
-        }
-
-        .back-link {
-            display: inline-flex;
-            align-items: center;
-            gap: 8px;
-            margin-bottom: 25px;
-            padding: 10px 20px;
-            background: white;
-            border-radius: 10px;
-            box-shadow: 0 4px 10px rgba(0, 0, 0, 0.08);
-            text-decoration: none;
-            color: var(--primary);
-            font-weight: 500;
-            transition: all 0.3s;
-        }
-
-        .back-link:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 6px 15px rgba(0, 0, 0, 0.12);
-            background: var(--secondary);
-            color: white;
-        }
-
-        .org-info {
-            background: white;
-            padding: 30px;
-            border-radius: 15px;
-            margin-bottom: 30px;
-            box-shadow: var(--card-shadow);
-            position: relative;
-            overflow: hidden;
-        }
-
-        .org-info::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            width: 100%;
-            height: 5px;
-            background: linear-gradient(90deg, var(--secondary), var(--success), var(--warning));
-        }
-
-        .org-header {
-            display: flex;
-            justify-content: space-between;
-            align-items: flex-start;
-            flex-wrap: wrap;
-            gap: 20px;
-            margin-bottom: 20px;
-            padding-bottom: 20px;
-            border-bottom: 1px solid #f0f3f7;
-        }
-
-        .org-title {
-            flex: 1;
-            min-width: 300px;
-        }
-
-        h1 {
-            font-family: 'Montserrat', sans-serif;
-            color: var(--primary);
-            font-size: 2rem;
-            margin-bottom: 10px;
-        }
-
-        .org-meta {
-            background: #f8fafc;
-            padding: 15px;
-            border-radius: 10px;
-            min-width: 250px;
-        }
-
-        .meta-item {
-            display: flex;
-            align-items: center;
-            gap: 10px;
-            margin-bottom: 12px;
-        }
-
-        .meta-item:last-child {
-            margin-bottom: 0;
-        }
-
-        .meta-icon {
-            width: 36px;
-            height: 36px;
-            border-radius: 50%;
-            background: var(--light);
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            color: var(--secondary);
-        }
-
-        .meta-content {
-            flex: 1;
-        }
-
-        .meta-label {
-            font-size: 0.85rem;
-            color: #718096;
-        }
-
-        .meta-value {
-            font-weight: 500;
-            color: var(--dark);
-        }
-
-        .info-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 20px;
-            margin-bottom: 30px;
-        }
-
-        .info-group {
-            margin-bottom: 20px;
-        }
-
-        .info-label {
-            font-weight: 500;
-            color: var(--primary);
-            margin-bottom: 8px;
-            display: flex;
-            align-items: center;
-            gap: 8px;
-        }
-
-        .info-value {
-            padding-left: 26px;
-            color: #2d3748;
-        }
-
-        .programs-header {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 20px;
-            flex-wrap: wrap;
-            gap: 15px;
-        }
-
-        h2 {
-            font-family: 'Montserrat', sans-serif;
-            color: var(--primary);
-            font-size: 1.8rem;
-        }
-
-        .program-count {
-            background: var(--secondary);
-            color: white;
-            padding: 5px 15px;
-            border-radius: 20px;
-            font-size: 1.1rem;
-        }
-
-        .programs-table {
-            width: 100%;
-            border-collapse: collapse;
-            background: white;
-            border-radius: 15px;
-            overflow: hidden;
-            box-shadow: var(--card-shadow);
-        }
-
-        .programs-table th {
-            background: linear-gradient(to right, var(--primary), var(--dark));
-            color: white;
-            padding: 16px 20px;
-            text-align: left;
-            font-weight: 600;
-        }
-
-        .programs-table td {
-            padding: 15px 20px;
-            border-bottom: 1px solid #f0f3f7;
-            color: #2d3748;
-        }
-
-        .programs-table tr:nth-child(even) {
-            background-color: #f8f9fa;
-        }
-
-        .programs-table tr:hover {
-            background-color: #f0f9ff;
-        }
-
-        .program-name {
-            font-weight: 500;
-            color: var(--primary);
-        }
-
-        .status-badge {
-            display: inline-block;
-            padding: 5px 12px;
-            border-radius: 20px;
-            font-size: 0.85rem;
-            font-weight: 500;
-        }
-
-        .status-accredited {
-            background: rgba(39, 174, 96, 0.15);
-            color: #27ae60;
-        }
-
-        .status-canceled {
-            background: rgba(231, 76, 60, 0.15);
-            color: #e74c3c;
-        }
-
-        .status-suspended {
-            background: rgba(243, 156, 18, 0.15);
-            color: #f39c12;
-        }
-
-        .no-programs {
-            background: white;
-            padding: 40px;
-            text-align: center;
-            border-radius: 15px;
-            box-shadow: var(--card-shadow);
-        }
-
-        .no-programs i {
-            font-size: 50px;
-            color: #cbd5e0;
-            margin-bottom: 20px;
-        }
-
-        .no-programs h3 {
-            color: #718096;
-            margin-bottom: 10px;
-        }
-
-        footer {
-            text-align: center;
-            margin-top: 40px;
-            padding: 20px;
-            color: #718096;
-            font-size: 14px;
-        }
-
-        @media (max-width: 768px) {
-            .org-header {
-                flex-direction: column;
-            }
-
-            .info-grid {
-                grid-template-columns: 1fr;
-            }
-
-            h1 {
-                font-size: 1.8rem;
-            }
-        }
-    </style>
+    <link rel="stylesheet" href="{{ asset_url('css/organization.css') }}">
 </head>
 <body>
     <div class="container">
@@ -1106,11 +1120,65 @@ if __name__ == '__main__':
             </div>
         </div>
 
+        {% if parents or branches %}
+        <div class="org-info branches">
+            {% if parents %}
+            <div class="info-label"><i class="fas fa-sitemap"></i> Головная организация</div>
+            <div class="info-value">
+                {% for parent in parents %}
+                    <a href="{{ url_for('organization_detail', org_id=parent.Id) }}">{{ parent.ShortName or parent.FullName }}</a>{% if not loop.last %} &rarr; {% endif %}
+                {% endfor %}
+            </div>
+            {% endif %}
+            {% if branches %}
+            <div class="info-label"><i class="fas fa-code-branch"></i> Филиалы ({{ branches|length }})</div>
+            <ul class="branch-list">
+                {% for branch in branches %}
+                <li>
+                    <a href="{{ url_for('organization_detail', org_id=branch.Id) }}">{{ branch.ShortName or branch.FullName }}</a>
+                    <span class="branch-region">{{ branch.RegionName }}</span>
+                </li>
+                {% endfor %}
+            </ul>
+            {% endif %}
+        </div>
+        {% endif %}
+
         <div class="programs-header">
             <h2>Образовательные программы</h2>
-            <div class="program-count">{{ programs|length }} программ</div>
+            {% if branches %}
+                {% if program_filters.branches %}
+                <a class="branch-toggle" href="{{ url_for('organization_detail', org_id=organization.Id) }}">Только программы организации</a>
+                {% else %}
+                <a class="branch-toggle" href="{{ url_for('organization_detail', org_id=organization.Id, branches=1) }}">Вместе с программами филиалов</a>
+                {% endif %}
+            {% endif %}
+            <div class="program-count">{{ programs_total }} программ</div>
         </div>
 
+        <form class="program-filters" method="get" action="{{ url_for('organization_detail', org_id=organization.Id) }}">
+            {% if program_filters.branches %}<input type="hidden" name="branches" value="1">{% endif %}
+            <select name="level_id">
+                <option value="">Все уровни</option>
+                {% for level in levels %}
+                <option value="{{ level.Id }}" {% if program_filters.level_id == level.Id %}selected{% endif %}>{{ level.Name }}</option>
+                {% endfor %}
+            </select>
+            <select name="status">
+                <option value="">Любой статус</option>
+                <option value="accredited" {% if program_filters.status == 'accredited' %}selected{% endif %}>Аккредитована</option>
+                <option value="active" {% if program_filters.status == 'active' %}selected{% endif %}>Действует</option>
+                <option value="canceled" {% if program_filters.status == 'canceled' %}selected{% endif %}>Отменена</option>
+                <option value="suspended" {% if program_filters.status == 'suspended' %}selected{% endif %}>Приостановлена</option>
+            </select>
+            <select name="sort">
+                <option value="name" {% if program_filters.sort == 'name' %}selected{% endif %}>По названию</option>
+                <option value="code" {% if program_filters.sort == 'code' %}selected{% endif %}>По коду</option>
+                <option value="level" {% if program_filters.sort == 'level' %}selected{% endif %}>По уровню</option>
+            </select>
+            <button type="submit"><i class="fas fa-filter"></i> Применить</button>
+        </form>
+
         {% if programs %}
         <table class="programs-table">
             <thead>
@@ -1121,27 +1189,16 @@ if __name__ == '__main__':
                     <th>Статус</th>
                 </tr>
             </thead>
-            <tbody>
-                {% for program in programs %}
-                <tr>
-                    <td class="program-name">{{ program.ProgrammName }}</td>
-                    <td>{{ program.EduLevelName }}</td>
-                    <td>{{ program.Qualification }}</td>
-                    <td>
-                        {% if program.IsAccredited %}
-                            <span class="status-badge status-accredited">Аккредитована</span>
-                        {% elif program.IsCanceled %}
-                            <span class="status-badge status-canceled">Отменена</span>
-                        {% elif program.IsSuspended %}
-                            <span class="status-badge status-suspended">Приостановлена</span>
-                        {% else %}
-                            -
-                        {% endif %}
-                    </td>
-                </tr>
-                {% endfor %}
+            <tbody id="program-rows">
+                {% include 'organization_programs.html' %}
             </tbody>
         </table>
+        {% if has_more %}
+        <div class="load-more">
+            <a id="load-more" href="{{ url_for('organization_detail', org_id=organization.Id, programs_page=programs_page + 1, **program_args) }}"
+               data-fragment="{{ url_for('organization_programs_fragment', org_id=organization.Id, programs_page=programs_page + 1, **program_args) }}">Показать еще</a>
+        </div>
+        {% endif %}
         {% else %}
         <div class="no-programs">
             <i class="fas fa-book-open"></i>
@@ -1154,7 +1211,51 @@ if __name__ == '__main__':
             <p>© 2023 Реестр образовательных организаций | Данные предоставлены Рособрнадзором</p>
         </footer>
     </div>
+
+    <script>
+        // Следующие страницы программ подгружаются фрагментом и дописываются в таблицу;
+        // без JavaScript ссылка открывает следующую страницу целиком
+        const loadMore = document.getElementById('load-more');
+        if (loadMore) {
+            loadMore.addEventListener('click', function(e) {
+                e.preventDefault();
+                fetch(loadMore.dataset.fragment).then(function(response) {
+                    const nextPage = response.headers.get('X-Next-Page');
+                    const nextFragment = response.headers.get('X-Next-Fragment');
+                    return response.text().then(function(html) {
+                        document.getElementById('program-rows').insertAdjacentHTML('beforeend', html);
+                        if (nextFragment) {
+                            loadMore.href = nextPage;
+                            loadMore.dataset.fragment = nextFragment;
+                        } else {
+                            loadMore.parentNode.remove();
+                        }
+                    });
+                });
+            });
+        }
+    </script>
 </body>
 </html>''')
 
+    with open('templates/organization_programs.html', 'w', encoding='utf-8') as f:
+        f.write('''{% for program in programs %}
+<tr>
+    <td class="program-name">{{ program.ProgrammName }}</td>
+    <td>{{ program.EduLevelName }}</td>
+    <td>{{ program.Qualification }}</td>
+    <td>
+        {% if program.IsAccredited %}
+            <span class="status-badge status-accredited">Аккредитована</span>
+        {% elif program.IsCanceled %}
+            <span class="status-badge status-canceled">Отменена</span>
+        {% elif program.IsSuspended %}
+            <span class="status-badge status-suspended">Приостановлена</span>
+        {% else %}
+            -
+        {% endif %}
+    </td>
+</tr>
+{% endfor %}''')
+
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,90 @@
+import os
+import json
+from datetime import datetime
+
+# Контентно-адресуемое хранилище архивов: файлы лежат в objects/<hash[:2]>/<hash>,
+# а manifest.json сопоставляет имени архива его хеш, размер, время загрузки
+# и HTTP-валидаторы. Манифест переписывается атомарно через os.replace
+KEEP_ARCHIVES = 7
+MANIFEST_VERSION = 1
+
+
+class CacheStore:
+    def __init__(self, root, keep=KEEP_ARCHIVES):
+        self.root = root
+        self.keep = keep
+        self.objects_dir = os.path.join(root, "objects")
+        self.manifest_path = os.path.join(root, "manifest.json")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.entries = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data.get("entries", {})
+
+    def _save(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "entries": self.entries}, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def lookup(self, name):
+        # Запись манифеста, если объект для нее действительно есть на диске
+        entry = self.entries.get(name)
+        if entry and os.path.exists(self.object_path(entry["hash"])):
+            return entry
+        return None
+
+    def path_for(self, name):
+        entry = self.lookup(name)
+        return self.object_path(entry["hash"]) if entry else None
+
+    def has(self, name, digest):
+        entry = self.lookup(name)
+        return entry is not None and entry["hash"] == digest
+
+    def is_fresh(self, name, size, validator):
+        # Архив не менялся на сервере, если совпадают размер и ETag/Last-Modified
+        entry = self.lookup(name)
+        return (entry is not None and validator is not None
+                and entry.get("validator") == validator and entry["size"] == size)
+
+    def put(self, name, path, digest, url=None, validator=None):
+        # Переносит загруженный файл в хранилище; одинаковое содержимое хранится один раз
+        target = self.object_path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(target):
+            os.remove(path)
+        else:
+            os.replace(path, target)
+        self.entries[name] = {
+            "hash": digest,
+            "size": os.path.getsize(target),
+            "fetched_at": datetime.now().isoformat(timespec="seconds"),
+            "url": url,
+            "validator": validator,
+        }
+        self._save()
+        return target
+
+    def prune(self):
+        # Оставляет последние keep архивов по времени загрузки и удаляет объекты без ссылок
+        ordered = sorted(self.entries.items(), key=lambda item: item[1]["fetched_at"], reverse=True)
+        self.entries = dict(ordered[:self.keep])
+        self._save()
+        referenced = {entry["hash"] for entry in self.entries.values()}
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            for digest in os.listdir(prefix_dir):
+                if digest not in referenced:
+                    os.remove(os.path.join(prefix_dir, digest))
+            if not os.listdir(prefix_dir):
+                os.rmdir(prefix_dir)
@@ -0,0 +1,97 @@
+import json
+import hashlib
+from datetime import datetime
+from sqlalchemy import select, delete, insert
+from models import DataLoad, ChangeLogEntry, RecordFingerprint
+
+# Журнал изменений между загрузками: каждая запись новой загрузки сравнивается
+# по отпечатку содержимого с предыдущей, в change_log попадают только
+# добавленные, измененные и удаленные записи
+
+ORGANIZATION_FIELDS = (
+    'Id', 'HeadEduOrgId', 'FullName', 'ShortName', 'IsBranch', 'PostAddress', 'Phone', 'Fax', 'Email',
+    'WebSite', 'OGRN', 'INN', 'KPP', 'HeadPost', 'HeadName', 'FormName', 'KindName', 'TypeName',
+    'RegionName', 'FederalDistrictName', 'FederalDistrictShortName',
+)
+PROGRAM_FIELDS = (
+    'Id', 'ProgrammCode', 'ProgrammName', 'TypeName', 'EduLevelName', 'UGSCode', 'UGSName',
+    'Qualification', 'EduNormativePeriod', 'Status',
+)
+
+
+def record_data(obj, fields):
+    return {field: getattr(obj, field) for field in fields}
+
+
+def encode(data):
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def fingerprint(encoded):
+    return hashlib.blake2b(encoded.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def snapshot_records(organizations, programs, associations):
+    # (тип, ключ) -> JSON записи в каноническом виде
+    records = {}
+    for org in organizations:
+        records[('organization', org.Id)] = encode(record_data(org, ORGANIZATION_FIELDS))
+    for program in programs:
+        records[('program', program.Id)] = encode(record_data(program, PROGRAM_FIELDS))
+    for assoc in associations:
+        records[('association', f"{assoc.organization_external_id}/{assoc.program_external_id}")] = encode({
+            'OrganizationId': assoc.organization_external_id,
+            'ProgramId': assoc.program_external_id,
+        })
+    return records
+
+
+def record_changes(session, archive_name, records):
+    # Сравнивает записи загрузки (snapshot_records) с отпечатками предыдущей,
+    # пишет data_loads/change_log и заменяет отпечатки; возвращает запись DataLoad
+    previous = {
+        (entity_type, entity_id): value
+        for entity_type, entity_id, value in session.execute(select(
+            RecordFingerprint.EntityType, RecordFingerprint.EntityId, RecordFingerprint.Fingerprint
+        ))
+    }
+    load = DataLoad(ArchiveName=archive_name, LoadedAt=datetime.now())
+    session.add(load)
+    session.flush()
+
+    changes = []
+    current = {}
+    for key, encoded in records.items():
+        current[key] = fingerprint(encoded)
+        old = previous.get(key)
+        if old is None:
+            changes.append((key, 'added', encoded))
+        elif old != current[key]:
+            changes.append((key, 'changed', encoded))
+    for key in previous.keys() - current.keys():
+        changes.append((key, 'removed', None))
+
+    # Порядок внутри загрузки, чтобы потребитель мог применять изменения по Id:
+    # добавления и изменения - организации, программы, связи; удаления - в обратном порядке
+    type_order = {'organization': 0, 'program': 1, 'association': 2}
+    changes.sort(key=lambda change: (
+        change[1] == 'removed',
+        -type_order[change[0][0]] if change[1] == 'removed' else type_order[change[0][0]],
+        change[0][1],
+    ))
+    if changes:
+        session.execute(insert(ChangeLogEntry), [
+            {'LoadId': load.Id, 'EntityType': entity_type, 'EntityId': entity_id, 'Action': action, 'Data': data}
+            for (entity_type, entity_id), action, data in changes
+        ])
+    load.AddedCount = sum(1 for change in changes if change[1] == 'added')
+    load.ChangedCount = sum(1 for change in changes if change[1] == 'changed')
+    load.RemovedCount = sum(1 for change in changes if change[1] == 'removed')
+
+    session.execute(delete(RecordFingerprint))
+    if current:
+        session.execute(insert(RecordFingerprint), [
+            {'EntityType': entity_type, 'EntityId': entity_id, 'Fingerprint': value}
+            for (entity_type, entity_id), value in current.items()
+        ])
+    return load
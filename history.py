@@ -0,0 +1,83 @@
+import json
+import zlib
+from sqlalchemy import select, func, insert
+from models import DataLoad, ChangeLogEntry, HistoryBase
+
+# История реестра: раз в HISTORY_BASE_INTERVAL загрузок сохраняется сжатый
+# базовый снимок всех записей, между снимками - только изменения из change_log.
+# Состояние записи на дату: последнее изменение после ближайшего базового
+# снимка, а если изменений не было - запись из этого снимка
+HISTORY_BASE_INTERVAL = 30
+HISTORY_BUCKETS = 64
+ENTITY_TYPES = ('organization', 'program', 'association')
+
+
+def bucket_of(entity_id):
+    return zlib.crc32(entity_id.encode('utf-8')) % HISTORY_BUCKETS
+
+
+def base_due(session, load, interval=HISTORY_BASE_INTERVAL):
+    # Базовый снимок нужен, если его еще нет или после последнего прошло interval загрузок
+    last_base = session.execute(select(func.max(HistoryBase.LoadId))).scalar()
+    return last_base is None or load.Id - last_base >= interval
+
+
+def write_history_base(session, load, records):
+    # records - (тип, ключ) -> канонический JSON записи (change_feed.snapshot_records);
+    # JSON корзины собирается из готовых строк без повторного разбора
+    buckets = {}
+    for (entity_type, entity_id), encoded in records.items():
+        buckets.setdefault((entity_type, bucket_of(entity_id)), []).append(
+            f'{json.dumps(entity_id, ensure_ascii=False)}:{encoded}'
+        )
+    rows = [
+        {'LoadId': load.Id, 'EntityType': entity_type, 'Bucket': bucket,
+         'Data': zlib.compress(('{' + ','.join(items) + '}').encode('utf-8'), 9)}
+        for (entity_type, bucket), items in buckets.items()
+    ]
+    if rows:
+        session.execute(insert(HistoryBase), rows)
+    return sum(len(row['Data']) for row in rows)
+
+
+def load_at(session, moment):
+    # Последняя загрузка не позже момента moment (datetime)
+    return session.query(DataLoad).filter(DataLoad.LoadedAt <= moment).order_by(DataLoad.Id.desc()).first()
+
+
+def entity_at(session, entity_type, entity_id, load_id):
+    # Состояние записи на загрузку load_id: dict или None, если записи не было
+    base_id = session.execute(
+        select(func.max(HistoryBase.LoadId)).where(
+            HistoryBase.EntityType == entity_type, HistoryBase.LoadId <= load_id
+        )
+    ).scalar()
+    change = session.query(ChangeLogEntry.Action, ChangeLogEntry.Data).filter(
+        ChangeLogEntry.EntityType == entity_type,
+        ChangeLogEntry.EntityId == entity_id,
+        ChangeLogEntry.LoadId <= load_id,
+        ChangeLogEntry.LoadId > (base_id or 0),
+    ).order_by(ChangeLogEntry.LoadId.desc()).first()
+    if change is not None:
+        action, data = change
+        return None if action == 'removed' else json.loads(data)
+    if base_id is None:
+        return None
+    blob = session.execute(
+        select(HistoryBase.Data).where(
+            HistoryBase.LoadId == base_id, HistoryBase.EntityType == entity_type,
+            HistoryBase.Bucket == bucket_of(entity_id)
+        )
+    ).scalar()
+    if blob is None:
+        return None
+    return json.loads(zlib.decompress(blob)).get(entity_id)
+
+
+def entity_versions(session, entity_type, entity_id):
+    # Все изменения записи по загрузкам: (DataLoad, Action)
+    return session.query(DataLoad, ChangeLogEntry.Action).join(
+        ChangeLogEntry, ChangeLogEntry.LoadId == DataLoad.Id
+    ).filter(
+        ChangeLogEntry.EntityType == entity_type, ChangeLogEntry.EntityId == entity_id
+    ).order_by(DataLoad.Id).all()
@@ -0,0 +1,58 @@
+import os
+import sys
+import json
+import subprocess
+
+# Проверка стоимости импорта веб-приложения: воркер не должен тянуть
+# зависимости загрузчика, а время импорта не должно выходить за бюджет
+IMPORT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', '1500'))
+FORBIDDEN_MODULES = ['xml_parser', 'requests', 'urllib3', 'xml.etree.ElementTree']
+# NumPy допустим только с колоночной моделью (READ_MODEL=1 или preload)
+if os.environ.get('READ_MODEL', '0') not in ('1', 'preload'):
+    FORBIDDEN_MODULES.append('numpy')
+
+PROBE = (
+    'import sys, json, app; '
+    f'print(json.dumps([m for m in {FORBIDDEN_MODULES!r} if m in sys.modules]))'
+)
+
+
+def measure():
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'Не удалось импортировать app:\n{result.stderr}')
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        # Формат: "import time:  self [us] | cumulative | imported package"
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) == 3 and parts[2].strip() == 'app':
+            cumulative_us = int(parts[1])
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return cumulative_us / 1000 if cumulative_us is not None else None, loaded
+
+
+def main():
+    elapsed_ms, loaded = measure()
+    ok = True
+    if elapsed_ms is None:
+        # Без строки importtime для app бюджет проверить нельзя - это тоже ошибка
+        print('Время импорта app не найдено в выводе -X importtime')
+        ok = False
+    else:
+        print(f'Импорт app: {elapsed_ms:.1f} мс (бюджет {IMPORT_BUDGET_MS:.0f} мс)')
+    if loaded:
+        print(f'Лишние модули в воркере: {", ".join(loaded)}')
+        ok = False
+    if elapsed_ms is not None and elapsed_ms > IMPORT_BUDGET_MS:
+        print('Время импорта превышает бюджет')
+        ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
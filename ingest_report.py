@@ -0,0 +1,95 @@
+import io
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import resource
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.wall_time = 0.0
+        self.rows = None
+        self.bytes = None
+        self.peak_rss_kb = None
+        self.peak_traced_kb = None
+        self.profile_path = None
+
+    def to_dict(self):
+        data = {'stage': self.name, 'wall_time': round(self.wall_time, 4)}
+        for key in ('rows', 'bytes', 'peak_rss_kb', 'peak_traced_kb', 'profile_path'):
+            value = getattr(self, key)
+            if value is not None:
+                data[key] = value
+        return data
+
+
+class IngestReport:
+    # Отчет по стадиям загрузки: время, строки, байты, пиковая память.
+    # profile_stages - имена стадий (или 'all') для записи cProfile,
+    # trace_memory включает tracemalloc для пика Python-аллокаций по стадиям
+    def __init__(self, profile_stages=(), profile_dir='profiles', trace_memory=False):
+        self.started_at = datetime.now()
+        self.stages = []
+        self.profile_stages = set(profile_stages)
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _should_profile(self, name):
+        return 'all' in self.profile_stages or name in self.profile_stages
+
+    @contextmanager
+    def stage(self, name):
+        current = Stage(name)
+        profiler = cProfile.Profile() if self._should_profile(name) else None
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield current
+        finally:
+            if profiler:
+                profiler.disable()
+            current.wall_time = time.perf_counter() - start
+            # ru_maxrss в Linux - килобайты, пик процесса на момент окончания стадии
+            current.peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            if self.trace_memory:
+                current.peak_traced_kb = tracemalloc.get_traced_memory()[1] // 1024
+            if profiler:
+                current.profile_path = self._dump_profile(name, profiler)
+            self.stages.append(current)
+            print(f"[{name}] {current.wall_time:.2f} с", file=sys.stderr)
+
+    def _dump_profile(self, name, profiler):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{self.started_at:%Y%m%d-%H%M%S}-{name}.prof")
+        profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(15)
+        print(out.getvalue(), file=sys.stderr)
+        return path
+
+    def to_dict(self):
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'total_time': round(sum(s.wall_time for s in self.stages), 4),
+            'stages': [s.to_dict() for s in self.stages],
+        }
+
+    def emit(self, path=None):
+        text = json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            print(text)
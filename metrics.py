@@ -0,0 +1,138 @@
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+# Границы корзин гистограмм задержки (в секундах)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+_lock = threading.Lock()
+_request_latency = defaultdict(Histogram)   # route -> Histogram
+_phase_latency = defaultdict(Histogram)     # (route, phase) -> Histogram
+_sql_statements = defaultdict(int)          # route -> число SQL-запросов
+_sql_seconds = defaultdict(float)           # route -> суммарное время SQL
+
+
+@contextmanager
+def phase(name):
+    # Замер отдельной фазы обработки запроса (запрос к БД, фасеты, рендеринг)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context() and hasattr(g, 'phases'):
+            g.phases[name] = g.phases.get(name, 0.0) + time.perf_counter() - start
+
+
+def _route_label():
+    return request.endpoint or 'unknown'
+
+
+def _before_request():
+    # Запросы прогрева (warmup.py) не попадают в гистограммы и счетчики
+    if request.environ.get('warmup'):
+        return
+    g.request_start = time.perf_counter()
+    g.phases = {}
+    g.sql_count = 0
+    g.sql_time = 0.0
+
+
+def _after_request(response):
+    if not hasattr(g, 'request_start'):
+        return response
+    elapsed = time.perf_counter() - g.request_start
+    route = _route_label()
+    with _lock:
+        _request_latency[route].observe(elapsed)
+        for name, value in g.phases.items():
+            _phase_latency[(route, name)].observe(value)
+        _sql_statements[route] += g.sql_count
+        _sql_seconds[route] += g.sql_time
+
+    # Разбивка по фазам для конкретного запроса доступна в заголовке Server-Timing
+    timings = [f'{name};dur={value * 1000:.2f}' for name, value in g.phases.items()]
+    timings.append(f'sql;desc="{g.sql_count} queries";dur={g.sql_time * 1000:.2f}')
+    timings.append(f'total;dur={elapsed * 1000:.2f}')
+    response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Время начала хранится в контексте выполнения: если запрос упадет,
+    # контекст уйдет вместе с ним и ничего не останется на соединении
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    if has_request_context() and hasattr(g, 'sql_count'):
+        g.sql_count += 1
+        g.sql_time += elapsed
+
+
+def _format_labels(labels):
+    return ','.join(f'{key}="{value}"' for key, value in labels)
+
+
+def _format_histogram(lines, name, labels, hist):
+    for bound, count in zip(hist.buckets, hist.counts):
+        lines.append(f'{name}_bucket{{{_format_labels(labels + [("le", bound)])}}} {count}')
+    lines.append(f'{name}_bucket{{{_format_labels(labels + [("le", "+Inf")])}}} {hist.count}')
+    lines.append(f'{name}_sum{{{_format_labels(labels)}}} {hist.sum:.6f}')
+    lines.append(f'{name}_count{{{_format_labels(labels)}}} {hist.count}')
+
+
+def render_metrics():
+    lines = []
+    with _lock:
+        lines.append('# HELP http_request_duration_seconds Время обработки HTTP-запроса')
+        lines.append('# TYPE http_request_duration_seconds histogram')
+        for route, hist in sorted(_request_latency.items()):
+            _format_histogram(lines, 'http_request_duration_seconds', [('route', route)], hist)
+
+        lines.append('# HELP http_request_phase_duration_seconds Время отдельных фаз обработки запроса')
+        lines.append('# TYPE http_request_phase_duration_seconds histogram')
+        for (route, name), hist in sorted(_phase_latency.items()):
+            _format_histogram(lines, 'http_request_phase_duration_seconds',
+                              [('route', route), ('phase', name)], hist)
+
+        lines.append('# HELP sql_statements_total Число SQL-запросов')
+        lines.append('# TYPE sql_statements_total counter')
+        for route, value in sorted(_sql_statements.items()):
+            lines.append(f'sql_statements_total{{route="{route}"}} {value}')
+
+        lines.append('# HELP sql_duration_seconds_total Суммарное время выполнения SQL-запросов')
+        lines.append('# TYPE sql_duration_seconds_total counter')
+        for route, value in sorted(_sql_seconds.items()):
+            lines.append(f'sql_duration_seconds_total{{route="{route}"}} {value:.6f}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app, engine):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
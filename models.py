@@ -0,0 +1,294 @@
+from sqlalchemy import (Column, String, Boolean, ForeignKey, Text, Integer, DateTime, LargeBinary, Index,
+                        literal_column, text)
+from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import declarative_base, relationship
+
+# Модели БД без зависимостей загрузчика: их импортирует и веб-приложение,
+# и xml_parser
+
+Base = declarative_base()
+
+# Биты поля EducationalProgram.Status
+STATUS_ACCREDITED = 1
+STATUS_CANCELED = 2
+STATUS_SUSPENDED = 4
+STATUS_INACTIVE = STATUS_CANCELED | STATUS_SUSPENDED
+
+def status_flag(column, mask):
+    # Константы подставляются литералами, а не параметрами: только так условие
+    # совпадает с WHERE частичного индекса и SQLite может его использовать
+    return column.op('&')(literal_column(str(mask))) != literal_column('0')
+
+# Справочники для повторяющихся текстовых значений: в основных таблицах
+# хранится только целочисленный ключ, а текст - один раз в справочнике
+class LookupMixin:
+    Id = Column(Integer, primary_key=True)
+    Name = Column(String, nullable=False, unique=True)
+
+class Region(LookupMixin, Base):
+    __tablename__ = 'regions'
+
+class FederalDistrict(Base):
+    __tablename__ = 'federal_districts'
+    Id = Column(Integer, primary_key=True)
+    Name = Column(String, nullable=False, unique=True)
+    ShortName = Column(String)
+
+class OrganizationForm(LookupMixin, Base):
+    __tablename__ = 'organization_forms'
+
+class OrganizationKind(LookupMixin, Base):
+    __tablename__ = 'organization_kinds'
+
+class OrganizationType(LookupMixin, Base):
+    __tablename__ = 'organization_types'
+
+class EduLevel(LookupMixin, Base):
+    __tablename__ = 'edu_levels'
+
+class UGS(LookupMixin, Base):
+    __tablename__ = 'ugs_groups'
+
+class Qualification(LookupMixin, Base):
+    __tablename__ = 'qualifications'
+
+class ProgramType(LookupMixin, Base):
+    __tablename__ = 'program_types'
+
+# Каталог программ: код, название, уровень, УГС и квалификация хранятся
+# один раз, а предложения организаций ссылаются на запись каталога
+class ProgramCatalogEntry(Base):
+    __tablename__ = 'program_catalog'
+    Id = Column(Integer, primary_key=True)
+    ProgrammCode = Column(String, index=True)
+    ProgrammName = Column(Text)
+    UGSCode = Column(String)
+    TypeId = Column(Integer, ForeignKey('program_types.Id'), index=True)
+    EduLevelId = Column(Integer, ForeignKey('edu_levels.Id'), index=True)
+    UGSId = Column(Integer, ForeignKey('ugs_groups.Id'), index=True)
+    QualificationId = Column(Integer, ForeignKey('qualifications.Id'), index=True)
+
+    program_type = relationship(ProgramType, lazy='joined')
+    edu_level = relationship(EduLevel, lazy='joined')
+    ugs = relationship(UGS, lazy='joined')
+    qualification = relationship(Qualification, lazy='joined')
+
+    TypeName = association_proxy('program_type', 'Name')
+    EduLevelName = association_proxy('edu_level', 'Name')
+    UGSName = association_proxy('ugs', 'Name')
+    Qualification = association_proxy('qualification', 'Name')
+
+class OrganizationProgramAssociation(Base):
+    __tablename__ = 'organization_program_association'
+    organization_external_id = Column(String, ForeignKey('educational_organizations.Id'), primary_key=True)
+    program_external_id = Column(String, ForeignKey('educational_programs.Id'), primary_key=True, index=True)
+    # Запись каталога продублирована в связи, чтобы поиск организаций по программе
+    # был одним индексным поиском без обращения к таблице предложений
+    CatalogId = Column(Integer, ForeignKey('program_catalog.Id'), index=True)
+
+    catalog = relationship(ProgramCatalogEntry)
+
+class EducationalOrganization(Base):
+    __tablename__ = 'educational_organizations'
+    Id = Column(String, primary_key=True)
+    HeadEduOrgId = Column(String)
+    FullName = Column(Text)
+    ShortName = Column(String)
+    IsBranch = Column(Boolean)
+    PostAddress = Column(Text)
+    Phone = Column(String)
+    Fax = Column(String)
+    Email = Column(String)
+    WebSite = Column(String)
+    # Идентификаторы для сверки по ИНН/ОГРН/КПП (POST /api/organizations/lookup)
+    OGRN = Column(String, index=True)
+    INN = Column(String, index=True)
+    KPP = Column(String, index=True)
+    HeadPost = Column(String)
+    HeadName = Column(String)
+    FormId = Column(Integer, ForeignKey('organization_forms.Id'), index=True)
+    KindId = Column(Integer, ForeignKey('organization_kinds.Id'), index=True)
+    TypeId = Column(Integer, ForeignKey('organization_types.Id'), index=True)
+    RegionId = Column(Integer, ForeignKey('regions.Id'), index=True)
+    FederalDistrictId = Column(Integer, ForeignKey('federal_districts.Id'), index=True)
+
+    form = relationship(OrganizationForm, lazy='joined')
+    kind = relationship(OrganizationKind, lazy='joined')
+    org_type = relationship(OrganizationType, lazy='joined')
+    region = relationship(Region, lazy='joined')
+    federal_district = relationship(FederalDistrict, lazy='joined')
+
+    # Прежние текстовые атрибуты для шаблонов и API
+    FormName = association_proxy('form', 'Name')
+    KindName = association_proxy('kind', 'Name')
+    TypeName = association_proxy('org_type', 'Name')
+    RegionName = association_proxy('region', 'Name')
+    FederalDistrictName = association_proxy('federal_district', 'Name')
+    FederalDistrictShortName = association_proxy('federal_district', 'ShortName')
+
+    stats = relationship("OrganizationStats", uselist=False, lazy='joined')
+
+    programs = relationship("EducationalProgram", secondary="organization_program_association", back_populates="organizations")
+
+# Агрегаты считаются один раз при загрузке (xml_parser.build_aggregates),
+# чтобы сортировка и статистика не требовали соединений на каждый запрос
+class OrganizationStats(Base):
+    __tablename__ = 'organization_stats'
+    OrganizationId = Column(String, ForeignKey('educational_organizations.Id'), primary_key=True)
+    ProgramCount = Column(Integer, nullable=False, default=0, index=True)
+    AccreditedCount = Column(Integer, nullable=False, default=0, index=True)
+    UGSCount = Column(Integer, nullable=False, default=0, index=True)
+
+class GroupStatsMixin:
+    OrganizationCount = Column(Integer, nullable=False, default=0)
+    BranchCount = Column(Integer, nullable=False, default=0)
+    ProgramCount = Column(Integer, nullable=False, default=0)
+    AccreditedCount = Column(Integer, nullable=False, default=0)
+    UGSCount = Column(Integer, nullable=False, default=0)
+
+class RegionStats(GroupStatsMixin, Base):
+    __tablename__ = 'region_stats'
+    RegionId = Column(Integer, ForeignKey('regions.Id'), primary_key=True)
+
+    region = relationship(Region, lazy='joined')
+
+class FederalDistrictStats(GroupStatsMixin, Base):
+    __tablename__ = 'federal_district_stats'
+    FederalDistrictId = Column(Integer, ForeignKey('federal_districts.Id'), primary_key=True)
+
+    federal_district = relationship(FederalDistrict, lazy='joined')
+
+# Замыкание иерархии головная организация -> филиалы по HeadEduOrgId:
+# строка на каждую пару предок/потомок, включая саму организацию с Depth = 0,
+# поэтому все филиалы любого уровня выбираются одним индексным поиском
+class OrganizationHierarchy(Base):
+    __tablename__ = 'organization_hierarchy'
+    AncestorId = Column(String, ForeignKey('educational_organizations.Id'), primary_key=True)
+    DescendantId = Column(String, ForeignKey('educational_organizations.Id'), primary_key=True, index=True)
+    Depth = Column(Integer, nullable=False)
+
+# Триграммный индекс для нечеткого поиска: документ - полное или краткое
+# название организации либо название программы из каталога, для каждого
+# документа хранится набор его триграмм (search.trigrams)
+class SearchDocument(Base):
+    __tablename__ = 'search_documents'
+    Id = Column(Integer, primary_key=True)
+    OrganizationId = Column(String, ForeignKey('educational_organizations.Id'), index=True)
+    CatalogId = Column(Integer, ForeignKey('program_catalog.Id'), index=True)
+    TrigramCount = Column(Integer, nullable=False)
+
+class SearchTrigram(Base):
+    __tablename__ = 'search_trigrams'
+    # Первичный ключ (Trigram, DocumentId) покрывает поиск по триграммам;
+    # без rowid таблица хранится прямо в этом B-дереве
+    Trigram = Column(String, primary_key=True)
+    DocumentId = Column(Integer, ForeignKey('search_documents.Id'), primary_key=True)
+
+    __table_args__ = {'sqlite_with_rowid': False}
+
+class EducationalProgram(Base):
+    __tablename__ = 'educational_programs'
+    # Предложение программы организацией: только атрибуты конкретного
+    # приложения к лицензии, общее описание программы - в каталоге
+    Id = Column(String, primary_key=True)
+    CatalogId = Column(Integer, ForeignKey('program_catalog.Id'), nullable=False, index=True)
+    EduNormativePeriod = Column(String)
+    Status = Column(Integer, nullable=False, default=0)
+
+    catalog = relationship(ProgramCatalogEntry, lazy='joined')
+
+    ProgrammName = association_proxy('catalog', 'ProgrammName')
+    ProgrammCode = association_proxy('catalog', 'ProgrammCode')
+    UGSCode = association_proxy('catalog', 'UGSCode')
+    TypeName = association_proxy('catalog', 'TypeName')
+    EduLevelName = association_proxy('catalog', 'EduLevelName')
+    UGSName = association_proxy('catalog', 'UGSName')
+    Qualification = association_proxy('catalog', 'Qualification')
+
+    __table_args__ = (
+        Index('ix_programs_accredited', 'Id', sqlite_where=text('("Status" & 1) != 0')),
+        Index('ix_programs_active', 'Id', sqlite_where=text('("Status" & 6) = 0')),
+    )
+
+    @hybrid_property
+    def IsAccredited(self):
+        return bool(self.Status & STATUS_ACCREDITED)
+
+    @IsAccredited.expression
+    def IsAccredited(cls):
+        return status_flag(cls.Status, STATUS_ACCREDITED)
+
+    @hybrid_property
+    def IsCanceled(self):
+        return bool(self.Status & STATUS_CANCELED)
+
+    @IsCanceled.expression
+    def IsCanceled(cls):
+        return status_flag(cls.Status, STATUS_CANCELED)
+
+    @hybrid_property
+    def IsSuspended(self):
+        return bool(self.Status & STATUS_SUSPENDED)
+
+    @IsSuspended.expression
+    def IsSuspended(cls):
+        return status_flag(cls.Status, STATUS_SUSPENDED)
+
+    @hybrid_property
+    def IsActive(self):
+        return not self.Status & STATUS_INACTIVE
+
+    @IsActive.expression
+    def IsActive(cls):
+        return cls.Status.op('&')(literal_column(str(STATUS_INACTIVE))) == literal_column('0')
+
+    organizations = relationship("EducationalOrganization", secondary="organization_program_association", back_populates="programs")
+
+# Таблицы, которые переживают перезагрузку реестра: загрузчик пересоздает
+# все остальные таблицы, а эти только дополняет (журнал изменений между загрузками)
+PERSISTENT_TABLES = {'data_loads', 'change_log', 'record_fingerprints', 'history_bases'}
+
+class DataLoad(Base):
+    __tablename__ = 'data_loads'
+    Id = Column(Integer, primary_key=True)
+    ArchiveName = Column(String)
+    LoadedAt = Column(DateTime, nullable=False)
+    AddedCount = Column(Integer, nullable=False, default=0)
+    ChangedCount = Column(Integer, nullable=False, default=0)
+    RemovedCount = Column(Integer, nullable=False, default=0)
+
+class ChangeLogEntry(Base):
+    __tablename__ = 'change_log'
+    # EntityType: organization, program или association (EntityId - "org_id/program_id");
+    # Action: added, changed, removed; Data - JSON новой версии записи (для removed - NULL)
+    Id = Column(Integer, primary_key=True)
+    LoadId = Column(Integer, ForeignKey('data_loads.Id'), nullable=False, index=True)
+    EntityType = Column(String, nullable=False)
+    EntityId = Column(String, nullable=False)
+    Action = Column(String, nullable=False)
+    Data = Column(Text)
+
+    __table_args__ = (
+        Index('ix_change_log_entity', 'EntityType', 'EntityId', 'LoadId'),
+    )
+
+class RecordFingerprint(Base):
+    __tablename__ = 'record_fingerprints'
+    # Отпечаток каждой записи последней загрузки для сравнения со следующей
+    EntityType = Column(String, primary_key=True)
+    EntityId = Column(String, primary_key=True)
+    Fingerprint = Column(String, nullable=False)
+
+    __table_args__ = {'sqlite_with_rowid': False}
+
+class HistoryBase(Base):
+    __tablename__ = 'history_bases'
+    # Базовый снимок состояния на загрузку LoadId (раз в несколько загрузок):
+    # записи одного типа разложены по корзинам crc32(EntityId) % HISTORY_BUCKETS,
+    # Data - сжатый zlib JSON {EntityId: запись}. Состояние на дату - базовый
+    # снимок плюс записи change_log после него
+    LoadId = Column(Integer, ForeignKey('data_loads.Id'), primary_key=True)
+    EntityType = Column(String, primary_key=True)
+    Bucket = Column(Integer, primary_key=True)
+    Data = Column(LargeBinary, nullable=False)
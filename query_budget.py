@@ -0,0 +1,51 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+# Бюджет времени на запросы одного HTTP-запроса в миллисекундах; 0 отключает.
+# SQLite вызывает обработчик прогресса каждые PROGRESS_STEPS инструкций
+# виртуальной машины, и если срок истек, запрос прерывается с "interrupted"
+QUERY_BUDGET_MS = float(os.environ.get('QUERY_BUDGET_MS', '2000'))
+PROGRESS_STEPS = 10000
+
+_deadline = threading.local()
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+def _progress_handler():
+    deadline = getattr(_deadline, 'value', None)
+    return 1 if deadline is not None and time.perf_counter() > deadline else 0
+
+
+def install_query_budget(engine):
+    @event.listens_for(engine, 'connect')
+    def set_progress_handler(dbapi_connection, connection_record):
+        dbapi_connection.set_progress_handler(_progress_handler, PROGRESS_STEPS)
+
+
+@contextmanager
+def query_budget(budget_ms=None):
+    # Все запросы внутри блока укладываются в общий срок; при превышении - BudgetExceeded
+    budget = QUERY_BUDGET_MS if budget_ms is None else budget_ms
+    if budget <= 0:
+        yield
+        return
+    previous = getattr(_deadline, 'value', None)
+    deadline = time.perf_counter() + budget / 1000
+    # Вложенный бюджет не продлевает внешний
+    _deadline.value = deadline if previous is None else min(previous, deadline)
+    try:
+        yield
+    except OperationalError as e:
+        if isinstance(e.orig, sqlite3.OperationalError) and 'interrupted' in str(e.orig):
+            raise BudgetExceeded(f'Запрос не уложился в {budget:.0f} мс') from e
+        raise
+    finally:
+        _deadline.value = previous
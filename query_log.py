@@ -0,0 +1,48 @@
+import os
+import time
+import logging
+from sqlalchemy import event
+
+# Порог медленного запроса в миллисекундах; 0 отключает журнал
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+
+logger = logging.getLogger('slow_query')
+
+
+def _explain(cursor, statement, parameters):
+    # План выполнения SQLite снимаем только для читающих запросов
+    if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    try:
+        plan_cursor = cursor.connection.cursor()
+        try:
+            plan_cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters or ())
+            rows = plan_cursor.fetchall()
+        finally:
+            plan_cursor.close()
+    except Exception as e:
+        return f'<не удалось получить план: {e}>'
+    return '\n'.join(f'  {row[-1]}' for row in rows)
+
+
+def install_slow_query_log(engine, threshold_ms=None):
+    threshold = (SLOW_QUERY_MS if threshold_ms is None else threshold_ms) / 1000
+    if threshold <= 0:
+        return
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Не в conn.info: у упавшего запроса after_cursor_execute не вызывается
+        context._slow_query_start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._slow_query_start
+        if elapsed < threshold:
+            return
+        plan = None if executemany else _explain(cursor, statement, parameters)
+        logger.warning(
+            'Медленный запрос (%.1f мс):\n%s\nПараметры: %s%s',
+            elapsed * 1000, statement, '<executemany>' if executemany else parameters,
+            f'\nПлан выполнения:\n{plan}' if plan else ''
+        )
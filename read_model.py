@@ -0,0 +1,334 @@
+import gc
+import os
+import threading
+from array import array
+from collections import namedtuple
+from sqlalchemy import func, null
+from models import (EducationalOrganization, EducationalProgram, OrganizationProgramAssociation,
+                    ProgramCatalogEntry, OrganizationStats, Region, OrganizationForm, OrganizationType, UGS,
+                    RegionStats, FederalDistrictStats, FederalDistrict, STATUS_ACCREDITED, STATUS_INACTIVE)
+
+# Колоночная модель списка организаций в памяти: реестр меняется раз в сутки
+# и целиком помещается в память, поэтому фильтры, сортировка и пагинация
+# главной страницы считаются без SQLite. Включается READ_MODEL=1.
+# С NumPy множества организаций - булевы массивы, без него - битовые множества
+# на целых числах Python (бит i - организация в позиции i).
+# READ_MODEL=preload строит модель при импорте app в главном процессе до fork
+# (gunicorn --preload -w N app:app): воркеры получают одну общую копию страниц
+# памяти и стартуют прогретыми
+READ_MODEL_MODE = os.environ.get('READ_MODEL', '0')
+READ_MODEL_ENABLED = READ_MODEL_MODE in ('1', 'preload')
+
+# NumPy нужен только модели: без READ_MODEL воркер его не импортирует
+np = None
+if READ_MODEL_ENABLED:
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+# Строка статистики региона или округа с полями GroupStatsMixin
+GroupStatsRow = namedtuple('GroupStatsRow', [
+    'Id', 'Name', 'ShortName', 'OrganizationCount', 'BranchCount', 'ProgramCount', 'AccreditedCount', 'UGSCount'
+])
+
+
+def group_stats_columns(model):
+    return (model.OrganizationCount, model.BranchCount, model.ProgramCount,
+            model.AccreditedCount, model.UGSCount)
+
+
+def int_column(values):
+    return np.array(values, dtype=np.int64) if np is not None else array('q', values)
+
+
+def text_sort_key(value):
+    # NULL в SQLite при сортировке по возрастанию идет первым
+    return (value is not None, value)
+
+
+class ReadModel:
+    def __init__(self, session, version=None):
+        self.version = version
+        self._load_organizations(session)
+        self._load_programs(session)
+        self._load_facets(session)
+        self._load_statistics(session)
+
+    def _load_organizations(self, session):
+        rows = session.query(
+            EducationalOrganization.Id,
+            func.coalesce(func.nullif(EducationalOrganization.ShortName, ''), EducationalOrganization.FullName),
+            EducationalOrganization.FullName,
+            func.coalesce(EducationalOrganization.RegionId, 0),
+            func.coalesce(EducationalOrganization.FormId, 0),
+            Region.Name,
+            OrganizationForm.Name,
+            OrganizationType.Name,
+            EducationalOrganization.Phone,
+            EducationalOrganization.Email,
+            func.coalesce(OrganizationStats.ProgramCount, 0),
+            func.coalesce(OrganizationStats.AccreditedCount, 0),
+            func.coalesce(OrganizationStats.UGSCount, 0),
+        ).select_from(EducationalOrganization).outerjoin(
+            Region, EducationalOrganization.RegionId == Region.Id
+        ).outerjoin(
+            OrganizationForm, EducationalOrganization.FormId == OrganizationForm.Id
+        ).outerjoin(
+            OrganizationType, EducationalOrganization.TypeId == OrganizationType.Id
+        ).outerjoin(
+            OrganizationStats, EducationalOrganization.Id == OrganizationStats.OrganizationId
+        ).order_by(EducationalOrganization.Id).all()
+
+        self.size = len(rows)
+        columns = list(zip(*rows)) if rows else [()] * 13
+        (self.ids, self.display_names, full_names, region_ids, form_ids,
+         self.region_names, self.form_names, self.type_names, self.phones, self.emails,
+         program_counts, accredited_counts, ugs_counts) = columns
+        self.positions = {org_id: position for position, org_id in enumerate(self.ids)}
+        self.program_counts = int_column(program_counts)
+        self.accredited_counts = int_column(accredited_counts)
+        self.ugs_counts = int_column(ugs_counts)
+
+        # Готовые битовые карты по региону и форме собственности
+        self.region_bitmaps = self._group_bitmaps(region_ids)
+        self.form_bitmaps = self._group_bitmaps(form_ids)
+
+        # Перестановки позиций для каждого поля и направления сортировки.
+        # Строки уже упорядочены по Id, а сортировка устойчива и с reverse=True,
+        # поэтому равные значения в обоих направлениях идут по возрастанию Id -
+        # как во втором ключе ORDER BY у app.sort_organizations
+        sort_keys = {
+            'FullName': lambda i: text_sort_key(full_names[i]),
+            'RegionName': lambda i: text_sort_key(self.region_names[i]),
+            'FormName': lambda i: text_sort_key(self.form_names[i]),
+            'TypeName': lambda i: text_sort_key(self.type_names[i]),
+            'ProgramCount': program_counts.__getitem__,
+            'AccreditedCount': accredited_counts.__getitem__,
+            'UGSCount': ugs_counts.__getitem__,
+        }
+        self.orders = {('Id', 'asc'): range(self.size), ('Id', 'desc'): range(self.size - 1, -1, -1)}
+        for key, sort_key in sort_keys.items():
+            self.orders[(key, 'asc')] = sorted(range(self.size), key=sort_key)
+            self.orders[(key, 'desc')] = sorted(range(self.size), key=sort_key, reverse=True)
+        if np is not None:
+            self.orders = {key: np.array(order, dtype=np.int64) for key, order in self.orders.items()}
+
+    def _load_programs(self, session):
+        catalog = session.query(
+            ProgramCatalogEntry.Id, ProgramCatalogEntry.ProgrammName,
+            ProgramCatalogEntry.ProgrammCode, func.coalesce(ProgramCatalogEntry.UGSId, 0)
+        ).order_by(ProgramCatalogEntry.Id).all()
+        catalog_positions = {row[0]: position for position, row in enumerate(catalog)}
+        self.catalog_names = [(row[1] or '').lower() for row in catalog]
+        self.catalog_codes = [row[2] for row in catalog]
+        self.catalog_ugs = int_column([row[3] for row in catalog])
+
+        assoc = session.query(
+            OrganizationProgramAssociation.organization_external_id,
+            OrganizationProgramAssociation.CatalogId,
+            EducationalProgram.Status,
+        ).join(
+            EducationalProgram, OrganizationProgramAssociation.program_external_id == EducationalProgram.Id
+        ).all()
+        assoc = [row for row in assoc if row[0] in self.positions and row[1] in catalog_positions]
+        self.assoc_orgs = int_column([self.positions[row[0]] for row in assoc])
+        self.assoc_catalog = int_column([catalog_positions[row[1]] for row in assoc])
+        self.assoc_status = int_column([row[2] for row in assoc])
+
+        # Битовые карты по УГС: организации, у которых есть программа этой группы
+        by_ugs = {}
+        for org_position, catalog_position in zip(self.assoc_orgs, self.assoc_catalog):
+            by_ugs.setdefault(int(self.catalog_ugs[catalog_position]), []).append(int(org_position))
+        self.ugs_bitmaps = {ugs_id: self.bitmap(positions) for ugs_id, positions in by_ugs.items() if ugs_id}
+
+    def _load_facets(self, session):
+        self.regions = session.query(Region.Id, Region.Name).order_by(Region.Name).all()
+        self.forms = session.query(OrganizationForm.Id, OrganizationForm.Name).order_by(OrganizationForm.Name).all()
+        self.ugs_groups = session.query(UGS.Id, UGS.Name).order_by(UGS.Name).all()
+        self.program_names = [
+            name for (name,) in session.query(ProgramCatalogEntry.ProgrammName).distinct() if name
+        ]
+
+    def _load_statistics(self, session):
+        self.region_stats = [
+            GroupStatsRow._make(row) for row in session.query(
+                RegionStats.RegionId, Region.Name, null(), *group_stats_columns(RegionStats)
+            ).join(Region, RegionStats.RegionId == Region.Id).order_by(RegionStats.OrganizationCount.desc())
+        ]
+        self.district_stats = [
+            GroupStatsRow._make(row) for row in session.query(
+                FederalDistrictStats.FederalDistrictId, FederalDistrict.Name, FederalDistrict.ShortName,
+                *group_stats_columns(FederalDistrictStats)
+            ).join(
+                FederalDistrict, FederalDistrictStats.FederalDistrictId == FederalDistrict.Id
+            ).order_by(FederalDistrictStats.OrganizationCount.desc())
+        ]
+
+    def _group_bitmaps(self, keys):
+        groups = {}
+        for position, key in enumerate(keys):
+            groups.setdefault(key, []).append(position)
+        return {key: self.bitmap(positions) for key, positions in groups.items() if key}
+
+    # Операции над множествами позиций организаций
+
+    def bitmap(self, positions):
+        if np is not None:
+            mask = np.zeros(self.size, dtype=bool)
+            mask[np.asarray(positions, dtype=np.int64)] = True
+            return mask
+        bits = bytearray((self.size + 7) // 8)
+        for position in positions:
+            bits[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(bits, 'little')
+
+    def everything(self):
+        if np is not None:
+            return np.ones(self.size, dtype=bool)
+        return (1 << self.size) - 1
+
+    def nothing(self):
+        return self.bitmap(())
+
+    def count(self, mask):
+        if np is not None:
+            return int(np.count_nonzero(mask))
+        return mask.bit_count()
+
+    def page(self, mask, sort_field, sort_order, offset, limit):
+        direction = 'asc' if sort_order == 'asc' else 'desc'
+        order = self.orders.get((sort_field, direction), self.orders[('Id', direction)])
+        if np is not None:
+            return [int(position) for position in order[mask[order]][offset:offset + limit]]
+        bits = mask.to_bytes((self.size + 7) // 8, 'little')
+        result = []
+        skipped = 0
+        for position in order:
+            if not bits[position >> 3] >> (position & 7) & 1:
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            result.append(position)
+            if len(result) == limit:
+                break
+        return result
+
+    # Фильтры главной страницы (те же параметры, что у app.parse_filters)
+
+    def match_programs(self, filters):
+        # Организации, у которых одна и та же программа удовлетворяет всем условиям
+        catalog_conditions = filters['program_name'] or filters['program_code']
+        status_conditions = filters['accredited'] or filters['active']
+        if filters['ugs_id'] and not catalog_conditions and not status_conditions:
+            return self.ugs_bitmaps.get(filters['ugs_id'], self.nothing())
+
+        name = filters['program_name'].lower()
+        code = filters['program_code']
+        ugs_id = filters['ugs_id']
+        if np is not None:
+            catalog_mask = np.ones(len(self.catalog_names), dtype=bool)
+            if name:
+                catalog_mask &= np.fromiter((name in n for n in self.catalog_names), dtype=bool,
+                                            count=len(self.catalog_names))
+            if code:
+                catalog_mask &= np.fromiter((c == code for c in self.catalog_codes), dtype=bool,
+                                            count=len(self.catalog_codes))
+            if ugs_id:
+                catalog_mask &= self.catalog_ugs == ugs_id
+            assoc_mask = catalog_mask[self.assoc_catalog]
+            if filters['accredited']:
+                assoc_mask &= (self.assoc_status & STATUS_ACCREDITED) != 0
+            if filters['active']:
+                assoc_mask &= (self.assoc_status & STATUS_INACTIVE) == 0
+            return self.bitmap(self.assoc_orgs[assoc_mask])
+
+        catalog_matches = {
+            position for position, (n, c) in enumerate(zip(self.catalog_names, self.catalog_codes))
+            if (not name or name in n) and (not code or c == code)
+            and (not ugs_id or self.catalog_ugs[position] == ugs_id)
+        }
+        positions = set()
+        for org_position, catalog_position, status in zip(self.assoc_orgs, self.assoc_catalog, self.assoc_status):
+            if catalog_position not in catalog_matches:
+                continue
+            if filters['accredited'] and not status & STATUS_ACCREDITED:
+                continue
+            if filters['active'] and status & STATUS_INACTIVE:
+                continue
+            positions.add(org_position)
+        return self.bitmap(positions)
+
+    def filter(self, filters):
+        mask = self.everything()
+        if filters['region_id']:
+            mask = mask & self.region_bitmaps.get(filters['region_id'], self.nothing())
+        if filters['form_id']:
+            mask = mask & self.form_bitmaps.get(filters['form_id'], self.nothing())
+        if filters['min_programs']:
+            if np is not None:
+                mask = mask & (self.program_counts >= filters['min_programs'])
+            else:
+                mask = mask & self.bitmap(
+                    i for i, count in enumerate(self.program_counts) if count >= filters['min_programs']
+                )
+        if (filters['program_name'] or filters['program_code'] or filters['ugs_id']
+                or filters['accredited'] or filters['active']):
+            mask = mask & self.match_programs(filters)
+        return mask
+
+    def row(self, position):
+        # Поля в порядке app.OrganizationRow
+        return (
+            self.ids[position], self.display_names[position], self.region_names[position],
+            self.form_names[position], self.type_names[position], self.phones[position], self.emails[position],
+            int(self.program_counts[position]), int(self.accredited_counts[position]),
+            int(self.ugs_counts[position]),
+        )
+
+    def listing(self, filters, sort_field, sort_order, offset, limit):
+        mask = self.filter(filters)
+        positions = self.page(mask, sort_field, sort_order, offset, limit)
+        return self.count(mask), [self.row(position) for position in positions]
+
+
+_model = None
+_lock = threading.Lock()
+
+
+def data_version(db_path):
+    # Версия данных - время изменения и размер файла БД: загрузчик пересоздает его раз в сутки
+    try:
+        stat = os.stat(db_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def preload_model(session_factory, db_path):
+    # Снимок до fork: после сборки объекты переносятся в постоянное поколение GC,
+    # чтобы сборщик мусора в воркерах не трогал их заголовки и не копировал
+    # страницы памяти при записи
+    global _model
+    with session_factory() as session:
+        _model = ReadModel(session, data_version(db_path))
+    gc.collect()
+    gc.freeze()
+    return _model
+
+
+def current_model(session_factory, db_path):
+    # Модель текущей версии данных; перестраивается один раз после новой загрузки
+    global _model
+    if not READ_MODEL_ENABLED:
+        return None
+    version = data_version(db_path)
+    model = _model
+    if model is not None and model.version == version:
+        return model
+    with _lock:
+        if _model is None or _model.version != version:
+            with session_factory() as session:
+                _model = ReadModel(session, version)
+        return _model
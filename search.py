@@ -0,0 +1,78 @@
+import re
+import math
+from functools import lru_cache
+from sqlalchemy import event, select, func, union_all, literal_column
+from models import SearchDocument, SearchTrigram, OrganizationProgramAssociation
+
+# Нечеткий поиск организаций по триграммам названий и названий программ.
+# Документ подходит, если в нем есть не меньше SEARCH_THRESHOLD триграмм запроса;
+# оценка - доля совпавших триграмм запроса с небольшой поправкой на длину
+# документа, совпадение по программе весит меньше, чем по названию
+SEARCH_THRESHOLD = 0.5
+PROGRAM_MATCH_WEIGHT = 0.6
+MAX_QUERY_TRIGRAMS = 64
+
+_non_word = re.compile(r'[^0-9a-zа-я]+')
+
+
+def normalize(text):
+    return _non_word.sub(' ', (text or '').lower().replace('ё', 'е')).strip()
+
+
+def _unicode_lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+def install_unicode_lower(engine):
+    # Встроенные lower() и LIKE в SQLite приводят к нижнему регистру только ASCII,
+    # и ilike по кириллице различал бы регистр. lower() заменяется на str.lower -
+    # тем же способом фильтр по названию программы считает колоночная модель
+    @event.listens_for(engine, 'connect')
+    def set_unicode_lower(dbapi_connection, connection_record):
+        dbapi_connection.create_function('lower', 1, _unicode_lower, deterministic=True)
+
+
+def trigrams(text):
+    # Как в pg_trgm: каждое слово дополняется двумя пробелами слева и одним справа,
+    # поэтому начало слова весит больше и короткие аббревиатуры тоже дают триграммы
+    result = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+@lru_cache(maxsize=256)
+def search_scores(q):
+    # Подзапрос (org_id, score) для строки поиска или None, если в ней нет слов.
+    # Зависит только от строки, поэтому один объект подзапроса переиспользуется
+    # фильтром и сортировкой по релевантности
+    query_trigrams = sorted(trigrams(q))[:MAX_QUERY_TRIGRAMS]
+    if not query_trigrams:
+        return None
+    total = len(query_trigrams)
+    matches = select(
+        SearchTrigram.DocumentId, func.count().label('shared')
+    ).where(
+        SearchTrigram.Trigram.in_(query_trigrams)
+    ).group_by(SearchTrigram.DocumentId).having(
+        func.count() >= max(1, math.ceil(SEARCH_THRESHOLD * total))
+    ).subquery('trigram_matches')
+
+    score = (matches.c.shared * literal_column('0.75') / total
+             + matches.c.shared * literal_column('0.25') / SearchDocument.TrigramCount)
+    by_name = select(
+        SearchDocument.OrganizationId.label('org_id'), score.label('score')
+    ).select_from(SearchDocument).join(matches, matches.c.DocumentId == SearchDocument.Id).where(
+        SearchDocument.OrganizationId.isnot(None)
+    )
+    by_program = select(
+        OrganizationProgramAssociation.organization_external_id.label('org_id'),
+        (score * PROGRAM_MATCH_WEIGHT).label('score')
+    ).select_from(SearchDocument).join(matches, matches.c.DocumentId == SearchDocument.Id).join(
+        OrganizationProgramAssociation, OrganizationProgramAssociation.CatalogId == SearchDocument.CatalogId
+    )
+    scored = union_all(by_name, by_program).subquery('scored')
+    return select(
+        scored.c.org_id, func.max(scored.c.score).label('score')
+    ).group_by(scored.c.org_id).subquery('search_scores')
@@ -0,0 +1,54 @@
+import threading
+
+# Объединение одновременных одинаковых запросов: первый поток выполняет
+# функцию, остальные с тем же ключом ждут и получают его результат
+# (или его исключение). Результат не кешируется - после завершения
+# следующий запрос с тем же ключом снова идет в БД
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        # Возвращает (результат, shared); shared=True - результат получен от другого потока
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+def normalize_key(*parts, **params):
+    # Ключ запроса независимо от порядка параметров; пустые значения
+    # (None, '', 0) фильтры не применяют, поэтому они не попадают в ключ
+    return parts + tuple(sorted((name, value) for name, value in params.items() if value not in (None, '', 0)))
@@ -0,0 +1,111 @@
+import os
+import gzip
+import hashlib
+from flask import abort, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Статические файлы с отпечатком содержимого в имени (index.3f2a9c1b.css):
+# при изменении файла меняется URL, поэтому ответ можно кешировать навсегда.
+# Сжатые варианты gzip/brotli готовятся один раз при запуске, а не на каждый запрос
+ASSET_DIRS = ('css',)
+ASSET_MAX_AGE = 365 * 24 * 3600
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_MIMETYPES = ('text/html', 'text/css', 'application/json')
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+BROTLI_STATIC_QUALITY = 11
+
+MIMETYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+}
+
+
+class Asset:
+    def __init__(self, name, data):
+        root, ext = os.path.splitext(name)
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        self.url_name = f"{root}.{self.digest}{ext}"
+        self.mimetype = MIMETYPES.get(ext, 'application/octet-stream')
+        # Варианты содержимого по Content-Encoding; None - без сжатия
+        self.variants = {None: data, 'gzip': gzip.compress(data, GZIP_LEVEL, mtime=0)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(data, quality=BROTLI_STATIC_QUALITY)
+
+
+def choose_encoding(available):
+    # Лучшая кодировка из доступных по Accept-Encoding; при равном весе - brotli
+    return request.accept_encodings.best_match([e for e in ('br', 'gzip') if e in available])
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, GZIP_LEVEL)
+
+
+def load_assets(static_dir):
+    assets = {}
+    for subdir in ASSET_DIRS:
+        directory = os.path.join(static_dir, subdir)
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            with open(os.path.join(directory, filename), 'rb') as f:
+                assets[f"{subdir}/{filename}"] = Asset(f"{subdir}/{filename}", f.read())
+    return assets
+
+
+def init_app(app):
+    assets = load_assets(app.static_folder)
+    by_url = {asset.url_name: asset for asset in assets.values()}
+
+    @app.template_global()
+    def asset_url(name):
+        asset = assets.get(name)
+        if asset is None:
+            # Файл не из ASSET_DIRS - обычная раздача /static без отпечатка
+            return app.url_for('static', filename=name)
+        return app.url_for('asset', filename=asset.url_name)
+
+    @app.route('/assets/<path:filename>')
+    def asset(filename):
+        asset = by_url.get(filename)
+        if asset is None:
+            abort(404)
+        encoding = choose_encoding(asset.variants)
+        response = app.response_class(asset.variants[encoding], content_type=asset.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+        response.set_etag(f"{asset.digest}-{encoding or 'identity'}")
+        return response.make_conditional(request)
+
+    @app.after_request
+    def compress_response(response):
+        # Сжатие HTML и JSON ответов; статика с отпечатком уже сжата заранее
+        if (response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESS_MIMETYPES
+                or not 200 <= response.status_code < 300):
+            return response
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        available = ('br', 'gzip') if brotli is not None else ('gzip',)
+        encoding = choose_encoding(available)
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, _ = response.get_etag()
+        if etag:
+            # Слабый ETag: сжатое представление отличается байтами от исходного
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,157 @@
+import io
+import os
+import sys
+import hashlib
+import zipfile
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import xml_parser
+
+
+def make_zip(text):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zip_ref:
+        zip_ref.writestr("data.xml", text)
+    return buffer.getvalue()
+
+
+class ArchiveServer(ThreadingHTTPServer):
+    # Локальная замена портала: отдает один архив, поддерживает Range/If-Range
+    # и по сценарию обрывает соединение посреди тела ответа
+    def __init__(self, payload, etag='"v1"'):
+        super().__init__(("127.0.0.1", 0), ArchiveHandler)
+        self.payload = payload
+        self.etag = etag
+        self.drops = []                 # сколько байт тела отдать в очередных ответах перед обрывом
+        self.no_content_range = 0       # сколько ответов 206 отдать без Content-Range
+        self.requests = []              # (Range, If-Range) каждого запроса
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/data-20261017.zip"
+
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        payload = server.payload
+        range_header = self.headers.get("Range")
+        server.requests.append((range_header, self.headers.get("If-Range")))
+        start = 0
+        if range_header and self.headers.get("If-Range") in (None, server.etag):
+            start = int(range_header[len("bytes="):].split("-")[0])
+            if start >= len(payload):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(payload)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        body = payload[start:]
+        if start:
+            self.send_response(206)
+            if server.no_content_range:
+                server.no_content_range -= 1
+            else:
+                self.send_header("Content-Range", f"bytes {start}-{len(payload) - 1}/{len(payload)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", server.etag)
+        self.end_headers()
+        if server.drops:
+            # Обрыв: заголовки обещают все тело, а сокет закрывается раньше
+            self.wfile.write(body[:server.drops.pop(0)])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+class DownloadArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.payload = make_zip("<Certificates>" + "x" * 500000 + "</Certificates>")
+        self.server = ArchiveServer(self.payload)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.original_cache_dir = xml_parser.CACHE_DIR
+        xml_parser.CACHE_DIR = self.cache_dir.name
+        self.part_path = os.path.join(self.cache_dir.name, "data-20261017.zip.part")
+
+    def tearDown(self):
+        xml_parser.CACHE_DIR = self.original_cache_dir
+        self.server.shutdown()
+        self.server.server_close()
+        self.cache_dir.cleanup()
+
+    def download(self, retries=5):
+        return xml_parser.download_archive(self.server.url, retries=retries, backoff=0)
+
+    def write_part(self, data, validator):
+        with open(self.part_path, "wb") as f:
+            f.write(data)
+        with open(self.part_path + ".validator", "w") as f:
+            f.write(validator)
+
+    def test_resumes_after_dropped_connections(self):
+        # iter_content пишет в .part целыми кусками, поэтому обрыв кратен размеру куска
+        chunk = xml_parser.DOWNLOAD_CHUNK_SIZE
+        self.server.drops = [2 * chunk, 3 * chunk]
+        path, digest, validator = self.download()
+        self.assertEqual(digest, hashlib.sha256(self.payload).hexdigest())
+        self.assertEqual(validator, '"v1"')
+        self.assertEqual(self.server.requests, [
+            (None, None),
+            (f"bytes={2 * chunk}-", '"v1"'),
+            (f"bytes={5 * chunk}-", '"v1"'),
+        ])
+        self.assertFalse(os.path.exists(self.part_path + ".validator"))
+
+    def test_range_not_satisfiable_restarts_from_zero(self):
+        self.write_part(self.payload + b"garbage", '"v1"')
+        path, digest, validator = self.download()
+        self.assertEqual(digest, hashlib.sha256(self.payload).hexdigest())
+        self.assertEqual(self.server.requests, [
+            (f"bytes={len(self.payload) + 7}-", '"v1"'),
+            (None, None),
+        ])
+
+    def test_changed_etag_restarts_from_zero(self):
+        self.write_part(make_zip("<Certificates>" + "o" * 5000 + "</Certificates>")[:1000], '"v0"')
+        path, digest, validator = self.download()
+        self.assertEqual(digest, hashlib.sha256(self.payload).hexdigest())
+        self.assertEqual(validator, '"v1"')
+        # If-Range со старым ETag: сервер отдает файл целиком, .part перезаписывается
+        self.assertEqual(self.server.requests, [("bytes=1000-", '"v0"')])
+
+    def test_partial_response_without_content_range_is_retried(self):
+        chunk = xml_parser.DOWNLOAD_CHUNK_SIZE
+        self.server.drops = [chunk]
+        self.server.no_content_range = 1
+        path, digest, validator = self.download()
+        self.assertEqual(digest, hashlib.sha256(self.payload).hexdigest())
+        self.assertEqual(self.server.requests, [
+            (None, None),
+            (f"bytes={chunk}-", '"v1"'),
+            (f"bytes={chunk}-", '"v1"'),
+        ])
+
+    def test_gives_up_after_retries(self):
+        self.server.drops = [xml_parser.DOWNLOAD_CHUNK_SIZE] * 3
+        with self.assertRaises(requests.RequestException):
+            self.download(retries=2)
+        self.assertEqual(len(self.server.requests), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import sys
+import random
+import itertools
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+import read_model
+import xml_parser
+from models import Base
+from search import install_unicode_lower
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+REGIONS = [("Москва", "ЦФО", "Центральный федеральный округ"),
+           ("Санкт-Петербург", "СЗФО", "Северо-Западный федеральный округ"),
+           ("Новосибирская область", "СФО", "Сибирский федеральный округ")]
+FORMS = ["Государственная", "Частная"]
+UGS_GROUPS = [("09.00.00", "Информатика и вычислительная техника"),
+              ("38.00.00", "Экономика и управление"),
+              ("44.00.00", "Образование и педагогические науки")]
+# Названия в разном регистре: фильтр по названию программы не должен его различать
+PROGRAMS = [("09.03.01", "Информатика и вычислительная техника"), ("38.03.01", "Экономика"),
+            ("38.04.01", "ЭКОНОМИКА ПРЕДПРИЯТИЯ"), ("38.03.02", "прикладная экономика"),
+            ("44.03.01", "Педагогическое образование"), ("09.04.01", "Informatics")]
+PROGRAM_NAME_FILTERS = ["", "эконом", "ЭКОНОМ", "Экономика предприятия", "informat", "нет такой"]
+
+
+def build_register(path, seed=1, size=40):
+    rnd = random.Random(seed)
+    root = ET.Element("OpenData")
+    certificates = ET.SubElement(root, "Certificates")
+    program_id = 0
+
+    def add_organization(parent, i):
+        region, district_short, district = REGIONS[i % len(REGIONS)]
+        org = ET.SubElement(parent, "ActualEducationOrganization")
+        for tag, value in (("Id", f"ORG{i:03d}"), ("HeadEduOrgId", f"ORG{i - 1:03d}" if i % 5 == 4 else ""),
+                           ("FullName", f"Университет {i}"), ("ShortName", f"У{i}" if i % 3 else ""),
+                           ("IsBranch", "1" if i % 5 == 4 else "0"), ("FormName", FORMS[i % len(FORMS)]),
+                           ("TypeName", "Образовательная организация высшего образования"),
+                           ("RegionName", region), ("FederalDistrictShortName", district_short),
+                           ("FederalDistrictName", district)):
+            ET.SubElement(org, tag).text = value
+
+    for i in range(size):
+        certificate = ET.SubElement(certificates, "Certificate")
+        add_organization(certificate, i)
+        supplements = ET.SubElement(certificate, "Supplements")
+        for _ in range(rnd.randint(0, 2)):
+            supplement = ET.SubElement(supplements, "Supplement")
+            add_organization(supplement, i)
+            programs = ET.SubElement(supplement, "EducationalPrograms")
+            for _ in range(rnd.randint(1, 5)):
+                program_id += 1
+                code, name = rnd.choice(PROGRAMS)
+                ugs_code, ugs_name = rnd.choice(UGS_GROUPS)
+                program = ET.SubElement(programs, "EducationalProgram")
+                for tag, value in (("Id", f"P{program_id}"), ("TypeName", "Основная"),
+                                   ("EduLevelName", "Высшее образование - бакалавриат"),
+                                   ("ProgrammName", name), ("ProgrammCode", code),
+                                   ("UGSCode", ugs_code), ("UGSName", ugs_name),
+                                   ("IsAccredited", rnd.choice("01")), ("IsCanceled", rnd.choice("001")),
+                                   ("IsSuspended", rnd.choice("0001"))):
+                    ET.SubElement(program, tag).text = value
+    ET.ElementTree(root).write(path, encoding="utf-8", xml_declaration=True)
+
+
+class ReadModelParityTest(unittest.TestCase):
+    # Колоночная модель (READ_MODEL=1) должна отдавать те же организации
+    # и в том же порядке, что и SQL-путь app.filter_organizations/sort_organizations
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        xml_path = os.path.join(cls.tmp_dir.name, "register.xml")
+        build_register(xml_path)
+        cls.engine = create_engine(f"sqlite:///{os.path.join(cls.tmp_dir.name, 'education.db')}")
+        install_unicode_lower(cls.engine)
+        Base.metadata.create_all(cls.engine)
+        cls.session = sessionmaker(bind=cls.engine)()
+        organizations, programs, associations = xml_parser.parse_xml(xml_path)
+        cls.session.add_all(organizations)
+        cls.session.add_all(programs)
+        cls.session.add_all(associations)
+        cls.session.add_all(xml_parser.build_hierarchy(organizations))
+        cls.session.flush()
+        xml_parser.build_aggregates(cls.session)
+        cls.session.commit()
+        cls.original_np = read_model.np
+
+    @classmethod
+    def tearDownClass(cls):
+        read_model.np = cls.original_np
+        cls.session.close()
+        cls.engine.dispose()
+        cls.tmp_dir.cleanup()
+
+    def models(self):
+        # С NumPy, если он установлен, и на битовых множествах Python
+        for np in ([numpy] if numpy is not None else []) + [None]:
+            read_model.np = np
+            yield ("numpy" if np is not None else "bitset"), read_model.ReadModel(self.session)
+
+    def sql_ids(self, filters):
+        query = app.filter_organizations(self.session.query(app.EducationalOrganization.Id), filters)
+        return sorted(org_id for (org_id,) in query)
+
+    def filter_combinations(self, model):
+        regions = [region_id for region_id, _ in model.regions] + [None, 999]
+        forms = [form_id for form_id, _ in model.forms] + [None]
+        ugs_groups = [ugs_id for ugs_id, _ in model.ugs_groups] + [None]
+        codes = ["", PROGRAMS[1][0]]
+        for values in itertools.product(regions, forms, ugs_groups, PROGRAM_NAME_FILTERS, codes,
+                                        [None, 1], [None, 1], [None, 3]):
+            yield dict(zip(('region_id', 'form_id', 'ugs_id', 'program_name', 'program_code',
+                            'accredited', 'active', 'min_programs'), values), q='')
+
+    def test_filters_match_sql(self):
+        expected_ids = {}
+        for kind, model in self.models():
+            for filters in self.filter_combinations(model):
+                key = tuple(filters.values())
+                if key not in expected_ids:
+                    expected_ids[key] = self.sql_ids(filters)
+                expected = expected_ids[key]
+                mask = model.filter(filters)
+                actual = [model.ids[position] for position in model.page(mask, 'Id', 'asc', 0, model.size)]
+                self.assertEqual(actual, expected, (kind, filters))
+                self.assertEqual(model.count(mask), len(expected), (kind, filters))
+
+    def test_program_name_ignores_cyrillic_case(self):
+        for kind, model in self.models():
+            lower, upper = (dict(next(self.filter_combinations(model)), program_name=name)
+                            for name in ("эконом", "ЭКОНОМ"))
+            expected = self.sql_ids(upper)
+            self.assertTrue(expected)
+            self.assertEqual(model.count(model.filter(lower)), len(expected), kind)
+
+    def sql_page(self, filters, sort_field, sort_order, offset, limit):
+        query = app.filter_organizations(app.listing_query(self.session), filters)
+        query = app.sort_organizations(query, sort_field, sort_order, join=False)
+        return [row[0] for row in query.offset(offset).limit(limit)]
+
+    def test_pages_match_sql(self):
+        expected_pages = {}
+        for kind, model in self.models():
+            for filters in itertools.islice(self.filter_combinations(model), 0, None, 97):
+                for sort_field, sort_order in itertools.product(app.SORT_FIELDS, ('asc', 'desc')):
+                    key = (tuple(filters.values()), sort_field, sort_order)
+                    if key not in expected_pages:
+                        expected_pages[key] = self.sql_page(filters, sort_field, sort_order, 5, 10)
+                    _, rows = model.listing(filters, sort_field, sort_order, 5, 10)
+                    self.assertEqual([row[0] for row in rows], expected_pages[key],
+                                     (kind, filters, sort_field, sort_order))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import Counter
+from flask import request
+from sqlalchemy import select, func
+from sqlalchemy.exc import OperationalError
+
+from models import DataLoad
+
+# Прогрев после новой загрузки: приложение раз в WARMUP_POLL_SECONDS проверяет
+# номер последней загрузки в data_loads и, если загрузчик записал новую, само
+# выполняет настроенные адреса (WARMUP_PATHS через запятую) и WARMUP_TOP_N
+# самых частых адресов последних запросов. Так пересборка колоночной модели,
+# чтение страниц БД с диска и компиляция шаблонов приходятся на прогрев,
+# а не на первых пользователей. Список частых адресов сохраняется в WARMUP_FILE, чтобы
+# после перезапуска прогревать те же страницы
+WARMUP_TOP_N = int(os.environ.get('WARMUP_TOP_N', '20'))
+WARMUP_PATHS = [path.strip() for path in os.environ.get('WARMUP_PATHS', '/').split(',') if path.strip()]
+WARMUP_POLL_SECONDS = float(os.environ.get('WARMUP_POLL_SECONDS', '30'))
+WARMUP_FILE = os.environ.get('WARMUP_FILE', 'warmup.json')
+# Учитываются только страницы и API, которые читают данные загрузки
+WARMUP_ENDPOINTS = ('index', 'api_organizations', 'organization_detail',
+                    'organization_programs_fragment', 'api_statistics', 'api_organization')
+MAX_TRACKED_PATHS = 10000
+
+logger = logging.getLogger('warmup')
+
+
+class Warmer:
+    def __init__(self, app, session_factory, top_n=WARMUP_TOP_N, paths=WARMUP_PATHS, state_path=WARMUP_FILE):
+        self.app = app
+        self.session_factory = session_factory
+        self.top_n = top_n
+        self.paths = paths
+        self.state_path = state_path
+        self.version = None
+        self.pid = None
+        self._lock = threading.Lock()
+        self._hits = Counter()
+        self._saved = self._load_saved()
+
+    def _load_saved(self):
+        if not os.path.exists(self.state_path):
+            return []
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('paths', [])
+        except (OSError, ValueError):
+            return []
+
+    def _save(self, paths):
+        # У каждого воркера свой временный файл, иначе одновременные записи смешаются
+        tmp_path = f'{self.state_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'paths': paths}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def record(self, response):
+        if (request.method == 'GET' and response.status_code == 200
+                and request.endpoint in WARMUP_ENDPOINTS and not request.environ.get('warmup')):
+            path = request.full_path.rstrip('?')
+            with self._lock:
+                self._hits[path] += 1
+                # Редкие адреса вытесняются, чтобы счетчик не рос без ограничения
+                if len(self._hits) > MAX_TRACKED_PATHS:
+                    self._hits = Counter(dict(self._hits.most_common(MAX_TRACKED_PATHS // 2)))
+        return response
+
+    def top_paths(self):
+        with self._lock:
+            recent = [path for path, _ in self._hits.most_common(self.top_n)]
+        # Пока после запуска мало запросов, добираем адреса из прошлого прогрева
+        paths = list(dict.fromkeys(self.paths + recent + self._saved))
+        return paths[:len(self.paths) + self.top_n]
+
+    def warm(self):
+        paths = self.top_paths()
+        start = time.perf_counter()
+        failed = 0
+        with self.app.test_client() as client:
+            for path in paths:
+                try:
+                    response = client.get(path, environ_base={'warmup': True})
+                    if response.status_code != 200:
+                        failed += 1
+                except Exception:
+                    logger.exception('Ошибка прогрева %s', path)
+                    failed += 1
+        self._saved = paths[len(self.paths):] if self.top_n > 0 else []
+        try:
+            self._save(self._saved)
+        except OSError as e:
+            logger.warning('Не удалось сохранить %s: %s', self.state_path, e)
+        # Частота запросов считается заново для данных новой загрузки
+        with self._lock:
+            self._hits.clear()
+        # Обычный прогрев - info, warning только если часть адресов не ответила 200
+        logger.log(logging.WARNING if failed else logging.INFO, 'Прогрев: %d адресов за %.2f с, с ошибкой %d',
+                   len(paths), time.perf_counter() - start, failed)
+        return len(paths), failed
+
+    def data_version(self):
+        # Id последней загрузки: data_loads пишется в той же транзакции, что и
+        # все данные, поэтому новый Id виден только после завершения загрузки
+        try:
+            with self.session_factory() as session:
+                return session.execute(select(func.max(DataLoad.Id))).scalar()
+        except OperationalError:
+            # Таблицы еще нет или БД занята загрузчиком - проверим в следующий раз
+            return self.version
+
+    def check(self):
+        version = self.data_version()
+        if version is None or version == self.version:
+            return False
+        self.version = version
+        self.warm()
+        return True
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.check()
+            except Exception:
+                logger.exception('Ошибка проверки версии данных')
+
+    def start(self, interval=WARMUP_POLL_SECONDS):
+        # Поток запускается в процессе, который обслуживает запросы: при импорте
+        # app (в том числе в мастере gunicorn --preload до fork) его нет, а поток
+        # не переживает fork, поэтому каждый воркер запускает свой при первом запросе
+        if self.pid == os.getpid():
+            return
+        with self._lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+        self.version = self.data_version()
+        threading.Thread(target=self._run, args=(interval,), name='warmup', daemon=True).start()
+
+
+def init_app(app, session_factory):
+    # Прогрев отключается, если нечего прогревать или WARMUP_POLL_SECONDS=0
+    if WARMUP_POLL_SECONDS <= 0 or (WARMUP_TOP_N <= 0 and not WARMUP_PATHS):
+        return None
+    warmer = Warmer(app, session_factory)
+    app.before_request(warmer.start)
+    app.after_request(warmer.record)
+    return warmer
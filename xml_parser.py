@@ -1,106 +1,54 @@
 import requests
 import zipfile
 import os
+import argparse
 import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import xml.etree.ElementTree as ET
-from sqlalchemy import create_engine, Column, String, Boolean, ForeignKey, Text, Integer
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from sqlalchemy import create_engine, select, insert, func, case, distinct, event, text
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.orm import sessionmaker
+from models import (Base, EducationalOrganization, EducationalProgram, OrganizationProgramAssociation,
+                    Region, FederalDistrict, OrganizationForm, OrganizationKind, OrganizationType,
+                    EduLevel, UGS, Qualification, ProgramType, ProgramCatalogEntry, OrganizationHierarchy,
+                    OrganizationStats, RegionStats, FederalDistrictStats, SearchDocument, SearchTrigram,
+                    PERSISTENT_TABLES, STATUS_ACCREDITED, STATUS_CANCELED, STATUS_SUSPENDED)
+from query_log import install_slow_query_log
+from ingest_report import IngestReport
+from cache_store import CacheStore, KEEP_ARCHIVES
+from search import trigrams
+from change_feed import record_changes, snapshot_records
+from history import HISTORY_BASE_INTERVAL, base_due, write_history_base
 import logging
 
-logging.basicConfig()
-logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
-
 CACHE_DIR = "cache"
 EXTRACT_DIR = "data"
 BASE_URL = "https://islod.obrnadzor.gov.ru/opendata/"
 BASE_DB_URL = 'sqlite:///education.db'
+LOOKBACK_DAYS = 3
+PROBE_RETRIES = 3
+PROBE_BACKOFF = 0.5
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Настройки соединения загрузчика в режиме массовой загрузки: без fsync на каждую
+# транзакцию, временные структуры и кэш страниц в памяти. synchronous=OFF опасен
+# только при сбое ОС или питания, а не при падении процесса. journal_mode не
+# меняется: OFF или MEMORY действуют на весь файл, и прерванная загрузка
+# испортила бы change_log и history_bases, которые не пересоздаются
+BULK_PRAGMAS = (
+    "PRAGMA synchronous=OFF",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-262144",
+)
 
-Base = declarative_base()
-
-class OrganizationProgramAssociation(Base):
-    __tablename__ = 'organization_program_association'
-    organization_external_id = Column(String, ForeignKey('educational_organizations.Id'), primary_key=True)
-    program_external_id = Column(String, ForeignKey('educational_programs.Id'), primary_key=True)
-
-class EducationalOrganization(Base):
-    __tablename__ = 'educational_organizations'
-    Id = Column(String, primary_key=True)
-    HeadEduOrgId = Column(String)
-    FullName = Column(Text)
-    ShortName = Column(String)
-    IsBranch = Column(Boolean)
-    PostAddress = Column(Text)
-    Phone = Column(String)
-    Fax = Column(String)
-    Email = Column(String)
-    WebSite = Column(String)
-    OGRN = Column(String)
-    INN = Column(String)
-    KPP = Column(String)
-    HeadPost = Column(String)
-    HeadName = Column(String)
-    FormName = Column(String)
-    KindName = Column(String)
-    TypeName = Column(String)
-    RegionName = Column(String)
-    FederalDistrictShortName = Column(String)
-    FederalDistrictName = Column(String)
-
-    programs = relationship("EducationalProgram", secondary="organization_program_association", back_populates="organizations")
-
-class EducationalProgram(Base):
-    __tablename__ = 'educational_programs'
-    Id = Column(String, primary_key=True)
-    TypeName = Column(String)
-    EduLevelName = Column(String)
-    ProgrammName = Column(Text)
-    ProgrammCode = Column(String)
-    UGSCode = Column(String)
-    UGSName = Column(String)
-    EduNormativePeriod = Column(String)
-    Qualification = Column(String)
-    IsAccredited = Column(String)
-    IsCanceled = Column(String)
-    IsSuspended = Column(String)
-
-    organizations = relationship("EducationalOrganization", secondary="organization_program_association", back_populates="programs")
-
-def file_hash(content):
-    return hashlib.sha256(content).hexdigest()
-
-def save_to_cache(url, content):
-    os.makedirs(CACHE_DIR, exist_ok=True)
-    file_name = url.split("/")[-1]
-    path = os.path.join(CACHE_DIR, file_name)
-    with open(path, "wb") as f:
-        f.write(content)
-    return path
-
-def has_file_changed(url, content):
-    hash_path = os.path.join(CACHE_DIR, "hashes.txt")
-    if not os.path.exists(hash_path):
-        return True
-    with open(hash_path, "r") as f:
-        for line in f:
-            if line.startswith(url.split("/")[-1] + ":"):
-                return line.strip().split(":")[1] != file_hash(content)
-    return True
-
-def update_hash(url, content):
-    file_name = url.split("/")[-1]
-    hash_path = os.path.join(CACHE_DIR, "hashes.txt")
-    hashes = {}
-    if os.path.exists(hash_path):
-        with open(hash_path, "r") as f:
-            for line in f:
-                if ":" in line:
-                    name, h = line.strip().split(":")
-                    hashes[name] = h
-    hashes[file_name] = file_hash(content)
-    with open(hash_path, "w") as f:
-        for name, h in hashes.items():
-            f.write(f"{name}:{h}\n")
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 def extract_archive(zip_path, extract_to):
     with zipfile.ZipFile(zip_path, "r") as zip_ref:
@@ -113,19 +61,140 @@ def clean_directory(directory, keep_files):
         if os.path.isfile(item_path) and item not in keep_files:
             os.remove(item_path)
 
-def download_if_updated(zip_url):
-    try:
-        response = requests.get(zip_url, timeout=10)
+def _read_validator(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return f.read().strip() or None
+
+def _range_total(content_range, offset):
+    # Полный размер файла из "bytes <начало>-<конец>/<размер>"; ответ 206 без
+    # заголовка, с неизвестным размером или не с той позиции не дописывается в .part
+    unit, _, spec = (content_range or "").partition(" ")
+    byte_range, _, total = spec.partition("/")
+    start = byte_range.split("-", 1)[0]
+    if unit != "bytes" or not total.isdigit() or not start.isdigit() or int(start) != offset:
+        raise requests.RequestException(f"Некорректный Content-Range: {content_range!r}")
+    return int(total)
+
+def _fetch_part(zip_url, part_path, validator_path):
+    # Один проход загрузки: продолжает .part с текущего размера через Range.
+    # If-Range гарантирует, что докачиваем тот же файл: если он изменился,
+    # сервер вернет 200 с полным телом и .part будет перезаписан
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    validator = _read_validator(validator_path)
+    headers = {}
+    if offset and validator:
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = validator
+    with requests.get(zip_url, headers=headers, stream=True, timeout=(5, 30)) as response:
+        if response.status_code == 416:
+            # Запрошенный диапазон за концом файла - .part уже полный или чужой
+            os.remove(part_path)
+            raise requests.RequestException("Некорректный размер частичной загрузки")
         response.raise_for_status()
-        if has_file_changed(zip_url, response.content):
+        if response.status_code == 206:
+            mode = "ab"
+            total = _range_total(response.headers.get("Content-Range"), offset)
+        else:
+            mode, offset = "wb", 0
+            total = int(response.headers.get("Content-Length", 0)) or None
+        validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+        with open(validator_path, "w") as f:
+            f.write(validator or "")
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+    size = os.path.getsize(part_path)
+    if total is not None and size != total:
+        raise requests.RequestException(f"Загрузка оборвана: {size} из {total} байт")
+
+def download_archive(zip_url, retries=DOWNLOAD_RETRIES, backoff=PROBE_BACKOFF):
+    # Качает архив в cache/<имя>.part, при обрывах докачивает недостающие байты.
+    # Возвращает путь к .part, его SHA-256 после проверки целостности архива
+    # и HTTP-валидатор (ETag или Last-Modified)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    part_path = os.path.join(CACHE_DIR, zip_url.split("/")[-1] + ".part")
+    validator_path = part_path + ".validator"
+    for attempt in range(retries):
+        try:
+            _fetch_part(zip_url, part_path, validator_path)
+            with zipfile.ZipFile(part_path) as zip_ref:
+                broken = zip_ref.testzip()
+            if broken is None:
+                validator = _read_validator(validator_path)
+                os.remove(validator_path)
+                return part_path, file_hash(part_path), validator
+            print(f"Архив поврежден ({broken}), загружаем заново")
+            os.remove(part_path)
+        except zipfile.BadZipFile:
+            print("Архив поврежден, загружаем заново")
+            os.remove(part_path)
+        except requests.RequestException as e:
+            if attempt == retries - 1:
+                raise
+            print(f"Повтор загрузки после ошибки: {e}")
+        if attempt < retries - 1:
+            time.sleep(backoff * 2 ** attempt)
+    raise requests.RequestException(f"Не удалось загрузить {zip_url} за {retries} попыток")
+
+def fetch_validator(zip_url):
+    # Размер и ETag/Last-Modified архива на сервере без загрузки тела
+    response = requests.head(zip_url, timeout=5)
+    response.raise_for_status()
+    size = int(response.headers.get("Content-Length", -1))
+    return size, response.headers.get("ETag") or response.headers.get("Last-Modified")
+
+def download_if_updated(zip_url, store):
+    # Возвращает путь к архиву в хранилище и признак того, что он изменился.
+    # Если валидаторы сервера совпадают с манифестом, архив не скачивается
+    name = zip_url.split("/")[-1]
+    try:
+        size, validator = fetch_validator(zip_url)
+        if store.is_fresh(name, size, validator):
+            return store.path_for(name), False
+        part_path, digest, validator = download_archive(zip_url)
+        changed = not store.has(name, digest)
+        if changed:
             print("Загружаем обновленный архив...")
-            cached_path = save_to_cache(zip_url, response.content)
-            update_hash(zip_url, response.content)
-            extract_archive(cached_path, EXTRACT_DIR)
+        return store.put(name, part_path, digest, zip_url, validator), changed
     except requests.RequestException as e:
         print(f"Ошибка загрузки: {e}")
         raise
 
+def archive_url(date_str):
+    return f"{BASE_URL}data-{date_str}-structure-20160713.zip"
+
+def probe_archive(zip_url, retries=PROBE_RETRIES, backoff=PROBE_BACKOFF):
+    # 404 и прочие ответы 4xx - архива нет; сетевые ошибки и 5xx повторяем с экспоненциальной паузой
+    for attempt in range(retries):
+        try:
+            status = requests.head(zip_url, timeout=5).status_code
+            if status == 200:
+                return True
+            if status < 500:
+                return False
+        except requests.RequestException:
+            pass
+        if attempt < retries - 1:
+            time.sleep(backoff * 2 ** attempt)
+    return False
+
+def find_latest_archive(lookback_days=LOOKBACK_DAYS):
+    # Проверяем все даты окна параллельно и берем самую свежую доступную:
+    # ждем ответа только по более новым датам, остальные проверки отменяем
+    dates = [(datetime.now() - timedelta(days=days_ago)).strftime("%Y%m%d")
+             for days_ago in range(1, lookback_days + 1)]
+    pool = ThreadPoolExecutor(max_workers=min(8, len(dates)))
+    try:
+        futures = [(date_str, pool.submit(probe_archive, archive_url(date_str))) for date_str in dates]
+        for date_str, future in futures:
+            if future.result():
+                return date_str, archive_url(date_str)
+        return None, None
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
 def get_text(element, tag):
     elem = element.find(tag)
     return elem.text.strip() if (elem is not None and elem.text is not None) else ""
@@ -133,17 +202,76 @@ def get_text(element, tag):
 def get_bool(element, tag):
     elem = element.find(tag)
     if elem is None or elem.text is None:
-        return "1" if tag == "IsAccredited" else "0"
-    text = elem.text.strip().lower()
-    if tag == "IsAccredited":
-        return "0" if text in ('1', 'true', 't', 'yes', 'y', 'да') else "1"
-    else:
-        return "1" if text in ('1', 'true', 't', 'yes', 'y', 'да') else "0"
+        return False
+    return elem.text.strip().lower() in ('1', 'true', 't', 'yes', 'y', 'да')
+
+def get_status(element):
+    # Битовые флаги статуса программы; отсутствующий тег - флаг не установлен
+    status = 0
+    if get_bool(element, "IsAccredited"):
+        status |= STATUS_ACCREDITED
+    if get_bool(element, "IsCanceled"):
+        status |= STATUS_CANCELED
+    if get_bool(element, "IsSuspended"):
+        status |= STATUS_SUSPENDED
+    return status
+
+class LookupEncoder:
+    # Заменяет повторяющееся текстовое значение записью справочника,
+    # создавая ее один раз на все строки загрузки
+    def __init__(self, model):
+        self.model = model
+        self.values = {}
+
+    def get(self, name, **extra):
+        if not name:
+            return None
+        item = self.values.get(name)
+        if item is None:
+            item = self.values[name] = self.model(Name=name, **extra)
+        return item
+
+class CatalogEncoder:
+    # Одна запись каталога на каждое уникальное сочетание описательных полей программы
+    def __init__(self, program_types, edu_levels, ugs_groups, qualifications):
+        self.program_types = program_types
+        self.edu_levels = edu_levels
+        self.ugs_groups = ugs_groups
+        self.qualifications = qualifications
+        self.entries = {}
+
+    def get(self, prog_elem):
+        key = tuple(get_text(prog_elem, tag) for tag in (
+            "ProgrammCode", "ProgrammName", "TypeName", "EduLevelName", "UGSCode", "UGSName", "Qualification"
+        ))
+        entry = self.entries.get(key)
+        if entry is None:
+            code, name, type_name, level, ugs_code, ugs_name, qualification = key
+            entry = self.entries[key] = ProgramCatalogEntry(
+                ProgrammCode=code,
+                ProgrammName=name,
+                UGSCode=ugs_code,
+                program_type=self.program_types.get(type_name),
+                edu_level=self.edu_levels.get(level),
+                ugs=self.ugs_groups.get(ugs_name),
+                qualification=self.qualifications.get(qualification)
+            )
+        return entry
 
 def parse_xml(xml_file):
     organizations = {}
     programs = {}
     associations = []
+    regions = LookupEncoder(Region)
+    districts = LookupEncoder(FederalDistrict)
+    forms = LookupEncoder(OrganizationForm)
+    kinds = LookupEncoder(OrganizationKind)
+    org_types = LookupEncoder(OrganizationType)
+    edu_levels = LookupEncoder(EduLevel)
+    ugs_groups = LookupEncoder(UGS)
+    qualifications = LookupEncoder(Qualification)
+    program_types = LookupEncoder(ProgramType)
+    catalog = CatalogEncoder(program_types, edu_levels, ugs_groups, qualifications)
     try:
         tree = ET.parse(xml_file)
         root = tree.getroot()
@@ -155,7 +283,7 @@ def parse_xml(xml_file):
                     HeadEduOrgId=get_text(org_elem, "HeadEduOrgId"),
                     FullName=get_text(org_elem, "FullName"),
                     ShortName=get_text(org_elem, "ShortName"),
-                    IsBranch=get_bool(org_elem, "IsBranch") == "1",
+                    IsBranch=get_bool(org_elem, "IsBranch"),
                     PostAddress=get_text(org_elem, "PostAddress"),
                     Phone=get_text(org_elem, "Phone"),
                     Fax=get_text(org_elem, "Fax"),
@@ -166,12 +294,14 @@ def parse_xml(xml_file):
                     KPP=get_text(org_elem, "KPP"),
                     HeadPost=get_text(org_elem, "HeadPost"),
                     HeadName=get_text(org_elem, "HeadName"),
-                    FormName=get_text(org_elem, "FormName"),
-                    KindName=get_text(org_elem, "KindName"),
-                    TypeName=get_text(org_elem, "TypeName"),
-                    RegionName=get_text(org_elem, "RegionName"),
-                    FederalDistrictShortName=get_text(org_elem, "FederalDistrictShortName"),
-                    FederalDistrictName=get_text(org_elem, "FederalDistrictName")
+                    form=forms.get(get_text(org_elem, "FormName")),
+                    kind=kinds.get(get_text(org_elem, "KindName")),
+                    org_type=org_types.get(get_text(org_elem, "TypeName")),
+                    region=regions.get(get_text(org_elem, "RegionName")),
+                    federal_district=districts.get(
+                        get_text(org_elem, "FederalDistrictName"),
+                        ShortName=get_text(org_elem, "FederalDistrictShortName")
+                    )
                 )
         for supplement in root.findall(".//Supplement"):
             for prog_elem in supplement.findall(".//EducationalProgram"):
@@ -180,65 +310,253 @@ def parse_xml(xml_file):
                 if prog_id not in programs:
                     programs[prog_id] = EducationalProgram(
                         Id=prog_id,
-                        TypeName=get_text(prog_elem, "TypeName"),
-                        EduLevelName=get_text(prog_elem, "EduLevelName"),
-                        ProgrammName=get_text(prog_elem, "ProgrammName"),
-                        ProgrammCode=get_text(prog_elem, "ProgrammCode"),
-                        UGSCode=get_text(prog_elem, "UGSCode"),
-                        UGSName=get_text(prog_elem, "UGSName"),
+                        catalog=catalog.get(prog_elem),
                         EduNormativePeriod=get_text(prog_elem, "EduNormativePeriod"),
-                        Qualification=get_text(prog_elem, "Qualification"),
-                        IsAccredited=get_bool(prog_elem, "IsAccredited"),
-                        IsCanceled=get_bool(prog_elem, "IsCanceled"),
-                        IsSuspended=get_bool(prog_elem, "IsSuspended")
+                        Status=get_status(prog_elem)
                     )
                 if org_id in organizations and prog_id in programs:
                     associations.append(OrganizationProgramAssociation(
                         organization_external_id=org_id,
-                        program_external_id=prog_id
+                        program_external_id=prog_id,
+                        catalog=programs[prog_id].catalog
                     ))
         return list(organizations.values()), list(programs.values()), associations
     except ET.ParseError as e:
         print(f"Ошибка парсинга XML: {e}")
         raise
 
-def main():
+def build_hierarchy(organizations):
+    # Для каждой организации - строка на саму себя и на каждую головную
+    # организацию вверх по цепочке HeadEduOrgId (Depth - число уровней)
+    heads = {org.Id: org.HeadEduOrgId for org in organizations}
+    rows = []
+    for org_id in heads:
+        rows.append(OrganizationHierarchy(AncestorId=org_id, DescendantId=org_id, Depth=0))
+        seen = {org_id}
+        head, depth = heads[org_id], 1
+        while head and head in heads and head not in seen:
+            rows.append(OrganizationHierarchy(AncestorId=head, DescendantId=org_id, Depth=depth))
+            seen.add(head)
+            head, depth = heads[head], depth + 1
+    return rows
+
+def _group_stats(model, key_name):
+    # Агрегаты по региону или федеральному округу из уже посчитанных агрегатов
+    # организаций; охват УГС считается отдельно, т.к. это число различных значений
+    org_key = getattr(EducationalOrganization, key_name)
+    member = EducationalOrganization.__table__.alias("member")
+    ugs_count = select(func.count(distinct(ProgramCatalogEntry.UGSId))).select_from(
+        OrganizationProgramAssociation.__table__.join(
+            ProgramCatalogEntry.__table__,
+            OrganizationProgramAssociation.CatalogId == ProgramCatalogEntry.Id
+        ).join(member, OrganizationProgramAssociation.organization_external_id == member.c.Id)
+    ).where(member.c[key_name] == org_key).scalar_subquery()
+    rows = select(
+        org_key,
+        func.count(EducationalOrganization.Id),
+        func.sum(case((EducationalOrganization.IsBranch, 1), else_=0)),
+        func.sum(OrganizationStats.ProgramCount),
+        func.sum(OrganizationStats.AccreditedCount),
+        ugs_count
+    ).join(
+        OrganizationStats, OrganizationStats.OrganizationId == EducationalOrganization.Id
+    ).where(org_key.is_not(None)).group_by(org_key)
+    return insert(model).from_select(
+        [key_name, "OrganizationCount", "BranchCount", "ProgramCount", "AccreditedCount", "UGSCount"], rows
+    )
+
+def build_aggregates(session):
+    # Число программ, аккредитованных программ и охват УГС по организациям,
+    # затем по регионам и федеральным округам - один раз на загрузку
+    org_rows = select(
+        EducationalOrganization.Id,
+        func.count(OrganizationProgramAssociation.program_external_id),
+        func.coalesce(func.sum(case((EducationalProgram.IsAccredited, 1), else_=0)), 0),
+        func.count(distinct(ProgramCatalogEntry.UGSId))
+    ).outerjoin(
+        OrganizationProgramAssociation,
+        OrganizationProgramAssociation.organization_external_id == EducationalOrganization.Id
+    ).outerjoin(
+        EducationalProgram, OrganizationProgramAssociation.program_external_id == EducationalProgram.Id
+    ).outerjoin(
+        ProgramCatalogEntry, OrganizationProgramAssociation.CatalogId == ProgramCatalogEntry.Id
+    ).group_by(EducationalOrganization.Id)
+    session.execute(insert(OrganizationStats).from_select(
+        ["OrganizationId", "ProgramCount", "AccreditedCount", "UGSCount"], org_rows
+    ))
+    session.execute(_group_stats(RegionStats, "RegionId"))
+    session.execute(_group_stats(FederalDistrictStats, "FederalDistrictId"))
+
+def build_search_index(session):
+    # Триграммы полного и краткого названия каждой организации и названия
+    # каждой записи каталога; возвращает число записанных триграмм
+    documents = []
+    for org_id, full_name, short_name in session.execute(select(
+            EducationalOrganization.Id, EducationalOrganization.FullName, EducationalOrganization.ShortName)):
+        for name in {full_name, short_name}:
+            documents.append((org_id, None, trigrams(name)))
+    for catalog_id, name in session.execute(select(ProgramCatalogEntry.Id, ProgramCatalogEntry.ProgrammName)):
+        documents.append((None, catalog_id, trigrams(name)))
+
+    document_rows, trigram_rows = [], []
+    for document_id, (org_id, catalog_id, document_trigrams) in enumerate(documents, 1):
+        if not document_trigrams:
+            continue
+        document_rows.append({"Id": document_id, "OrganizationId": org_id, "CatalogId": catalog_id,
+                              "TrigramCount": len(document_trigrams)})
+        trigram_rows.extend({"Trigram": trigram, "DocumentId": document_id} for trigram in document_trigrams)
+    if document_rows:
+        session.execute(insert(SearchDocument), document_rows)
+        session.execute(insert(SearchTrigram), trigram_rows)
+    return len(trigram_rows)
+
+def rebuilt_tables():
+    # Таблицы, которые пересоздаются при каждой загрузке
+    return [table for table in Base.metadata.sorted_tables if table.name not in PERSISTENT_TABLES]
+
+def install_bulk_pragmas(engine):
+    @event.listens_for(engine, "connect")
+    def set_bulk_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in BULK_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+def create_tables_bare(connection, tables):
+    # Только CREATE TABLE: индексы строятся после загрузки одним проходом по данным
+    for table in tables:
+        connection.execute(CreateTable(table))
+
+def create_deferred_indexes(connection, tables):
+    count = 0
+    for table in tables:
+        for index in table.indexes:
+            index.create(connection)
+            count += 1
+    return count
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"ожидается целое число не меньше 1: {value}")
+    return number
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Загрузка реестра образовательных организаций")
+    parser.add_argument("--lookback-days", type=positive_int, default=LOOKBACK_DAYS,
+                        help="за сколько последних дней искать архив")
+    parser.add_argument("--archive", metavar="NAME",
+                        help="загрузить архив из кэша по имени без обращения к порталу (откат)")
+    parser.add_argument("--keep-archives", type=int, default=KEEP_ARCHIVES,
+                        help="сколько последних архивов хранить в кэше")
+    parser.add_argument("--report", metavar="PATH",
+                        help="куда записать JSON-отчет по стадиям (по умолчанию stdout)")
+    parser.add_argument("--profile", metavar="STAGE", action="append", default=[],
+                        help="снять cProfile для стадии (probe, download, extract, clean, schema, parse, load, changes, indexes, history, aggregates, search_index, commit, analyze) или all")
+    parser.add_argument("--profile-dir", default="profiles",
+                        help="каталог для .prof файлов")
+    parser.add_argument("--history-base-interval", type=int, default=HISTORY_BASE_INTERVAL,
+                        help="через сколько загрузок сохранять базовый снимок истории")
+    parser.add_argument("--bulk-load", action=argparse.BooleanOptionalAction, default=True,
+                        help="таблицы без индексов, настройки SQLite для загрузки, индексы и ANALYZE в конце")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="замерять пик Python-аллокаций по стадиям через tracemalloc")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = IngestReport(args.profile, args.profile_dir, args.tracemalloc)
     try:
-        actual_zip_url = None
-        for days_ago in range(1, 4):
-            date_str = (datetime.now() - timedelta(days=days_ago)).strftime("%Y%m%d")
-            zip_url = f"{BASE_URL}data-{date_str}-structure-20160713.zip"
-            try:
-                if requests.head(zip_url, timeout=5).status_code == 200:
-                    actual_zip_url = zip_url
-                    break
-            except requests.RequestException:
-                continue
-        if not actual_zip_url:
-            raise Exception("Не удалось найти актуальный архив за последние 3 дня")
-        download_if_updated(actual_zip_url)
-        clean_directory("cache", ["hashes.txt", os.path.basename(actual_zip_url)])
-        clean_directory("data", [f"data-{date_str}-structure-20160713.xml"])
+        store = CacheStore(CACHE_DIR, args.keep_archives)
+        if args.archive:
+            archive_name = args.archive
+            cached_path, changed = store.path_for(archive_name), True
+            if not cached_path:
+                raise Exception(f"Архив {archive_name} отсутствует в кэше")
+        else:
+            with report.stage("probe"):
+                date_str, actual_zip_url = find_latest_archive(args.lookback_days)
+                if not actual_zip_url:
+                    raise Exception(f"Не удалось найти актуальный архив за последние {args.lookback_days} дн.")
+            with report.stage("download") as stage:
+                cached_path, changed = download_if_updated(actual_zip_url, store)
+                stage.bytes = os.path.getsize(cached_path) if changed else 0
+            archive_name = os.path.basename(actual_zip_url)
+        date_str = archive_name.split("-")[1]
+        xml_name = f"data-{date_str}-structure-20160713.xml"
+        xml_file = os.path.join(EXTRACT_DIR, xml_name)
+        if changed or not os.path.exists(xml_file):
+            with report.stage("extract") as stage:
+                extract_archive(cached_path, EXTRACT_DIR)
+                stage.bytes = os.path.getsize(xml_file)
+        with report.stage("clean"):
+            store.prune()
+            clean_directory(CACHE_DIR, ["manifest.json"])
+            clean_directory(EXTRACT_DIR, [xml_name])
         engine = create_engine(BASE_DB_URL)
-        Base.metadata.drop_all(engine)
-        Base.metadata.create_all(engine)
+        install_slow_query_log(engine)
+        if args.bulk_load:
+            install_bulk_pragmas(engine)
+        with report.stage("schema"):
+            # Журнал изменений и отпечатки прошлой загрузки не пересоздаются
+            Base.metadata.drop_all(engine, tables=rebuilt_tables())
+            if args.bulk_load:
+                with engine.begin() as connection:
+                    create_tables_bare(connection, rebuilt_tables())
+            Base.metadata.create_all(engine)
         with sessionmaker(bind=engine)() as session:
-            xml_file = os.path.join(EXTRACT_DIR, f"data-{date_str}-structure-20160713.xml")
-            organizations, programs, associations = parse_xml(xml_file)
-            session.add_all(organizations)
-            session.add_all(programs)
-            session.add_all(associations)
-            session.commit()
+            with report.stage("parse") as stage:
+                organizations, programs, associations = parse_xml(xml_file)
+                hierarchy = build_hierarchy(organizations)
+                stage.rows = len(organizations) + len(programs) + len(associations) + len(hierarchy)
+                stage.bytes = os.path.getsize(xml_file)
+            with report.stage("load") as stage:
+                session.add_all(organizations)
+                session.add_all(programs)
+                session.add_all(associations)
+                session.add_all(hierarchy)
+                session.flush()
+                stage.rows = len(organizations) + len(programs) + len(associations) + len(hierarchy)
+            with report.stage("changes") as stage:
+                records = snapshot_records(organizations, programs, associations)
+                data_load = record_changes(session, archive_name, records)
+                stage.rows = data_load.AddedCount + data_load.ChangedCount + data_load.RemovedCount
+            if args.bulk_load:
+                # Индексы строятся в той же транзакции сразу после загрузки:
+                # агрегаты и поисковый индекс ниже уже читают таблицы по ним
+                with report.stage("indexes") as stage:
+                    stage.rows = create_deferred_indexes(session.connection(), rebuilt_tables())
+            if base_due(session, data_load, args.history_base_interval):
+                with report.stage("history") as stage:
+                    stage.rows = len(records)
+                    stage.bytes = write_history_base(session, data_load, records)
+            with report.stage("aggregates"):
+                build_aggregates(session)
+            with report.stage("search_index") as stage:
+                stage.rows = build_search_index(session)
+            with report.stage("commit"):
+                session.commit()
+            if args.bulk_load:
+                with report.stage("analyze"):
+                    with engine.begin() as connection:
+                        connection.execute(text("ANALYZE"))
             print(f"\nУспешно загружено:")
             print(f"- Организаций: {len(organizations)}")
             print(f"- Образовательных программ: {len(programs)}")
+            print(f"- Записей каталога программ: {len({id(p.catalog) for p in programs})}")
             print(f"- Связей между организациями и программами: {len(associations)}")
+            print(f"- Изменений с прошлой загрузки (загрузка {data_load.Id}): "
+                  f"добавлено {data_load.AddedCount}, изменено {data_load.ChangedCount}, "
+                  f"удалено {data_load.RemovedCount}")
             print("\nПример связей:")
             for assoc in associations[:5]:
                 print(f"{assoc.organization_external_id} {assoc.program_external_id}")
     except Exception as e:
         print(f"\nКритическая ошибка: {e}")
         raise
+    finally:
+        report.emit(args.report)
 
 if __name__ == "__main__":
+    logging.basicConfig()
     main()